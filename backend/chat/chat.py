@@ -4,12 +4,12 @@ import uuid
 from gpt_researcher.utils.llm import get_llm
 from gpt_researcher.memory import Memory
 from gpt_researcher.config.config import Config
+from gpt_researcher.utils.text_splitter import SentenceTextSplitter
 
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
 
 from langchain_community.vectorstores import InMemoryVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.tools import Tool, tool
 
 class ChatAgentWithMemory:
@@ -73,11 +73,9 @@ class ChatAgentWithMemory:
         
     def _process_document(self, report):
         """Split Report into Chunks"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1024,
-            chunk_overlap=20,
-            length_function=len,
-            is_separator_regex=False,
+        text_splitter = SentenceTextSplitter(
+            chunk_size=300,
+            chunk_overlap=10,
         )
         documents = text_splitter.split_text(report)
         return documents
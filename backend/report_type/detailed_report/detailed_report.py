@@ -3,6 +3,7 @@ from typing import List, Dict, Set, Optional, Any
 from fastapi import WebSocket
 
 from gpt_researcher import GPTResearcher
+from gpt_researcher.context import WrittenSectionIndex
 
 
 class DetailedReport:
@@ -41,6 +42,13 @@ class DetailedReport:
         self.existing_headers: List[Dict] = []
         self.global_context: List[str] = []
         self.global_written_sections: List[str] = []
+        # Chunks used by a subtopic are not sent again to the report of a later subtopic
+        self.global_chunk_ids: Set[str] = set()
+        # Written sections are embedded once, as they are written, for all later subtopics
+        self.written_section_index = WrittenSectionIndex(
+            self.gpt_researcher.memory.get_embeddings(),
+            usage_meter=self.gpt_researcher.embedding_usage,
+        )
         self.global_urls: Set[str] = set(
             self.source_urls) if self.source_urls else set()
 
@@ -96,10 +104,12 @@ class DetailedReport:
             agent=self.gpt_researcher.agent,
             role=self.gpt_researcher.role,
             tone=self.tone,
+            excluded_chunk_ids=self.global_chunk_ids,
         )
 
         subtopic_assistant.context = list(set(self.global_context))
         await subtopic_assistant.conduct_research()
+        self.global_chunk_ids.update(chunk["chunk_id"] for chunk in subtopic_assistant.get_research_chunks())
 
         draft_section_titles = await subtopic_assistant.get_draft_section_titles(current_subtopic_task)
 
@@ -111,12 +121,17 @@ class DetailedReport:
             "text", "") for header in parse_draft_section_titles]
 
         relevant_contents = await subtopic_assistant.get_similar_written_contents_by_draft_section_titles(
-            current_subtopic_task, parse_draft_section_titles_text, self.global_written_sections
+            current_subtopic_task,
+            parse_draft_section_titles_text,
+            self.global_written_sections,
+            section_index=self.written_section_index,
         )
 
         subtopic_report = await subtopic_assistant.write_report(self.existing_headers, relevant_contents)
 
-        self.global_written_sections.extend(self.gpt_researcher.extract_sections(subtopic_report))
+        written_sections = self.gpt_researcher.extract_sections(subtopic_report)
+        self.global_written_sections.extend(written_sections)
+        await self.written_section_index.add_sections(written_sections)
         self.global_context = list(set(subtopic_assistant.context))
         self.global_urls.update(subtopic_assistant.visited_urls)
 
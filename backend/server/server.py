@@ -8,6 +8,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
+from gpt_researcher.memory.embedding_cache import get_embedding_cache
+from gpt_researcher.retrievers.health import retriever_health
+from gpt_researcher.retrievers.key_pool import get_key_pools_usage
+
 from backend.server.websocket_manager import WebSocketManager
 from backend.server.server_utils import (
     get_config_dict,
@@ -88,6 +92,22 @@ async def list_files():
     return {"files": files}
 
 
+@app.get("/api/retrievers/health")
+async def get_retrievers_health():
+    return retriever_health.snapshot()
+
+
+@app.get("/api/retrievers/keys")
+async def get_retrievers_key_usage():
+    return get_key_pools_usage()
+
+
+@app.get("/api/embeddings/cache")
+async def get_embedding_cache_stats():
+    cache = get_embedding_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
 @app.post("/api/multi_agents")
 async def run_multi_agents():
     return await execute_multi_agents(manager)
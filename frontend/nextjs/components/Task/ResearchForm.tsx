@@ -107,6 +107,7 @@ export default function ResearchForm({
           <option value="web">The Internet</option>
           <option value="local">My Documents</option>
           <option value="hybrid">Hybrid</option>
+          <option value="fast">Fast (Search Snippets)</option>
         </select>
       </div>
       {/* Conditional file upload if the report source is 'local' or 'hybrid' */}
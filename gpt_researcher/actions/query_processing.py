@@ -1,26 +1,19 @@
+import asyncio
+import json
 import json_repair
-from ..utils.llm import create_chat_completion
+import numpy as np
+from ..context.bm25 import term_similarity, term_vector
+from ..memory.embeddings import embed_queries
+from ..utils.cassette import get_cassette
+from ..utils.costs import estimate_llm_cost
+from ..utils.llm import create_chat_completion, get_llm
 from ..prompts import generate_search_queries_prompt
-from typing import Any, List, Dict
+from typing import Any, AsyncIterator, List, Dict, Optional
 from ..config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def get_search_results(query: str, retriever: Any) -> List[Dict[str, Any]]:
-    """
-    Get web search results for a given query.
-    
-    Args:
-        query: The search query
-        retriever: The retriever instance
-    
-    Returns:
-        A list of search results
-    """
-    search_retriever = retriever(query)
-    return search_retriever.search()
-
 async def generate_sub_queries(
     query: str,
     parent_query: str,
@@ -76,6 +69,127 @@ async def generate_sub_queries(
 
     return json_repair.loads(response)
 
+class SubQueryStreamParser:
+    """
+    Incrementally parses a streamed JSON array of strings, such as ["query 1", "query 2"],
+    returning every string as soon as its literal is closed.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.buffer = []
+        self.done = False
+
+    def feed(self, text: str) -> List[str]:
+        completed = []
+        for char in text:
+            if self.done:
+                break
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    self.buffer.append(char)
+                elif char == "\\":
+                    self.escape = True
+                    self.buffer.append(char)
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        completed.append(self._decode("".join(self.buffer)))
+                    self.buffer = []
+                else:
+                    self.buffer.append(char)
+            elif char == "[":
+                self.depth += 1
+            elif char == "]" and self.depth > 0:
+                self.depth -= 1
+                self.done = self.depth == 0
+            elif char == '"' and self.depth > 0:
+                self.in_string = True
+        return [sub_query for sub_query in completed if sub_query.strip()]
+
+    @staticmethod
+    def _decode(literal: str) -> str:
+        try:
+            return json.loads(f'"{literal}"')
+        except json.JSONDecodeError:
+            return literal
+
+
+async def stream_sub_queries(
+    query: str,
+    parent_query: str,
+    report_type: str,
+    context: List[Dict[str, Any]],
+    cfg: Config,
+    cost_callback: callable = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_sub_queries that yields every sub-query as soon as the
+    strategic LLM has finished generating it, so research can start on the first one.
+
+    Args:
+        query: The original query
+        parent_query: The parent query
+        report_type: The type of report
+        context: Search results context
+        cfg: Configuration object
+        cost_callback: Callback for cost calculation
+
+    Yields:
+        The sub-queries, one by one
+    """
+    # Cassettes record whole completions, so replayable runs use the non streaming path
+    if get_cassette().enabled:
+        for sub_query in await generate_sub_queries(query, parent_query, report_type, context, cfg, cost_callback):
+            yield sub_query
+        return
+
+    gen_queries_prompt = generate_search_queries_prompt(
+        query,
+        parent_query,
+        report_type,
+        max_iterations=cfg.max_iterations or 1,
+        context=context
+    )
+    messages = [{"role": "user", "content": gen_queries_prompt}]
+    parser = SubQueryStreamParser()
+    response = ""
+    yielded = 0
+
+    try:
+        provider = get_llm(
+            cfg.strategic_llm_provider,
+            model=cfg.strategic_llm_model,
+            temperature=1,
+            max_tokens=None,
+            **(cfg.llm_kwargs or {}),
+        )
+        async for chunk in provider.stream_chunks(messages):
+            response += chunk
+            for sub_query in parser.feed(chunk):
+                yielded += 1
+                yield sub_query
+    except Exception as e:
+        if yielded:
+            logger.warning(f"Error while streaming sub-queries: {e}. Continuing with {yielded} sub-queries.")
+        else:
+            logger.warning(f"Error streaming sub-queries with strategic LLM: {e}. Falling back to non streaming generation.")
+            for sub_query in await generate_sub_queries(query, parent_query, report_type, context, cfg, cost_callback):
+                yield sub_query
+            return
+
+    if cost_callback:
+        cost_callback(estimate_llm_cost(str(messages), response))
+
+    # The model did not answer with a well formed array, repair the whole response instead
+    if not yielded:
+        for sub_query in json_repair.loads(response) or []:
+            yield str(sub_query)
+
+
 async def plan_research_outline(
     query: str,
     search_results: List[Dict[str, Any]],
@@ -111,3 +225,109 @@ async def plan_research_outline(
     )
 
     return sub_queries
+
+
+async def deduplicate_sub_queries(
+    sub_queries: List[str],
+    embeddings: Any,
+    similarity_threshold: float,
+    keep: Optional[List[str]] = None,
+    lexical: bool = False,
+) -> List[str]:
+    """
+    Merge paraphrased sub-queries by embedding them as queries, like the chunk store searches
+    them, and keeping only the first of every group whose cosine similarity is at or above the threshold.
+
+    Args:
+        sub_queries: The sub-queries to deduplicate
+        embeddings: The embeddings provider
+        similarity_threshold: Cosine similarity above which two queries are considered the same
+        keep: Queries that are always kept, e.g. the original query. Sub-queries similar to them are dropped.
+        lexical: Compare the term vectors of the queries instead of embedding them, for RETRIEVAL_MODE=bm25
+
+    Returns:
+        The deduplicated sub-queries, in their original order
+    """
+    keep = keep or []
+    if similarity_threshold >= 1 or len(sub_queries) < 2:
+        return sub_queries
+
+    if lexical:
+        vectors = [term_vector(sub_query) for sub_query in sub_queries]
+        similarities = np.array([[term_similarity(a, b) for b in vectors] for a in vectors], dtype=np.float32)
+    else:
+        try:
+            vectors = np.array(await embed_queries(embeddings, sub_queries), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Error embedding sub-queries for deduplication: {e}. Keeping all sub-queries.")
+            return sub_queries
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        similarities = vectors @ vectors.T
+
+    # Queries to keep are considered first so paraphrases of them are the ones dropped
+    order = [i for i, q in enumerate(sub_queries) if q in keep] + [i for i, q in enumerate(sub_queries) if q not in keep]
+    kept: List[int] = []
+    for i in order:
+        if sub_queries[i] in keep or not kept or similarities[i, kept].max() < similarity_threshold:
+            kept.append(i)
+        else:
+            logger.info(f"Dropping sub-query '{sub_queries[i]}' as a duplicate of '{sub_queries[kept[int(similarities[i, kept].argmax())]]}'")
+
+    return [sub_queries[i] for i in sorted(kept)]
+
+
+class SubQueryDeduplicator:
+    """
+    Incremental version of deduplicate_sub_queries for sub-queries that arrive one by one.
+    Each sub-query costs one query embedding, or none when lexical.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any,
+        similarity_threshold: float,
+        keep: Optional[List[str]] = None,
+        lexical: bool = False,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.keep = keep or []
+        self.lexical = lexical
+        self.vectors: List[Any] = []
+        self.seen = set()
+
+    async def _embed(self, text: str) -> Any:
+        if self.lexical:
+            return term_vector(text)
+        vector = np.array(await asyncio.to_thread(self.embeddings.embed_query, text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _max_similarity(self, vector: Any) -> float:
+        if self.lexical:
+            return max(term_similarity(vector, kept) for kept in self.vectors)
+        return float(np.max(np.stack(self.vectors) @ vector))
+
+    async def is_duplicate(self, sub_query: str) -> bool:
+        """Returns whether the sub-query repeats a kept query, and remembers it if it does not"""
+        if sub_query in self.seen:
+            return True
+        self.seen.add(sub_query)
+        if self.similarity_threshold >= 1:
+            return False
+
+        try:
+            if not self.vectors and self.keep:
+                self.vectors = [await self._embed(query) for query in self.keep]
+                self.seen.update(self.keep)
+                if sub_query in self.keep:
+                    return True
+            vector = await self._embed(sub_query)
+        except Exception as e:
+            logger.warning(f"Error embedding sub-query for deduplication: {e}. Keeping it.")
+            return False
+
+        if self.vectors and self._max_similarity(vector) >= self.similarity_threshold:
+            logger.info(f"Dropping sub-query '{sub_query}' as a duplicate")
+            return True
+        self.vectors.append(vector)
+        return False
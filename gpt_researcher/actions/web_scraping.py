@@ -2,6 +2,7 @@ from typing import List, Dict, Any, Tuple
 from colorama import Fore, Style
 from ..scraper import Scraper
 from ..config.config import Config
+from ..utils.cassette import CassetteMiss
 from ..utils.logger import get_formatted_logger
 
 logger = get_formatted_logger()
@@ -31,6 +32,9 @@ def scrape_urls(urls, cfg=None) -> Tuple[List[Dict[str, Any]], List[Dict[str, An
         for item in scraped_data:
             if 'image_urls' in item:
                 images.extend([img for img in item['image_urls']])
+    except CassetteMiss:
+        # A page that was not recorded must fail the replay, not be scraped as empty
+        raise
     except Exception as e:
         print(f"{Fore.RED}Error in scrape_urls: {e}{Style.RESET_ALL}")
 
@@ -2,7 +2,9 @@ from typing import Optional, List, Dict, Any, Set
 import json
 
 from .config import Config
+from .context.section_index import WrittenSectionIndex
 from .memory import Memory
+from .memory.usage import EmbeddingUsageMeter
 from .utils.enum import ReportSource, ReportType, Tone
 from .llm_provider import GenericLLMProvider
 from .vector_store import VectorStoreWrapper
@@ -48,6 +50,7 @@ class GPTResearcher:
         context=[],
         headers: dict = None,
         max_subtopics: int = 5,
+        excluded_chunk_ids: Optional[Set[str]] = None,
     ):
         self.query = query
         self.report_type = report_type
@@ -62,8 +65,15 @@ class GPTResearcher:
         self.complement_source_urls: bool = complement_source_urls
         self.research_sources = []  # The list of scraped sources including title, content and images
         self.research_images = []  # The list of selected research images
+        self.research_chunks = []  # The chunks in the context, each under the sub-query it is most relevant to, with its relevance score
+        self.excluded_chunk_ids = set(excluded_chunk_ids or ())  # Chunks already in the context of another researcher, e.g. a previous subtopic
         self.documents = documents
-        self.vector_store = VectorStoreWrapper(vector_store) if vector_store else None
+        self.vector_store = VectorStoreWrapper(
+            vector_store,
+            batch_size=self.cfg.vector_store_batch_size,
+            max_pending=self.cfg.vector_store_max_pending,
+            manifest_path=self.cfg.vector_store_manifest or None,
+        ) if vector_store else None
         self.vector_store_filter = vector_store_filter
         self.websocket = websocket
         self.agent = agent
@@ -75,6 +85,7 @@ class GPTResearcher:
         self.context = context
         self.headers = headers or {}
         self.research_costs = 0.0
+        self.embedding_usage = EmbeddingUsageMeter(cost_callback=self.add_costs)
         self.retrievers = get_retrievers(self.headers, self.cfg)
         self.memory = Memory(
             self.cfg.embedding_provider, self.cfg.embedding_model, **self.cfg.embedding_kwargs
@@ -124,13 +135,15 @@ class GPTResearcher:
         current_subtopic: str,
         draft_section_titles: List[str],
         written_contents: List[Dict],
-        max_results: int = 10
+        max_results: int = 10,
+        section_index: Optional[WrittenSectionIndex] = None,
     ) -> List[str]:
         return await self.context_manager.get_similar_written_contents_by_draft_section_titles(
             current_subtopic,
             draft_section_titles,
             written_contents,
-            max_results
+            max_results,
+            section_index=section_index,
         )
 
     # Utility methods
@@ -146,6 +159,12 @@ class GPTResearcher:
     def add_research_sources(self, sources: List[Dict[str, Any]]) -> None:
         self.research_sources.extend(sources)
 
+    def get_research_chunks(self) -> List[Dict[str, Any]]:
+        return self.research_chunks
+
+    def add_research_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        self.research_chunks.extend(chunks)
+
     def add_references(self, report_markdown: str, visited_urls: set) -> str:
         return add_references(report_markdown, visited_urls)
 
@@ -164,6 +183,9 @@ class GPTResearcher:
     def get_research_context(self) -> list:
         return self.context
 
+    def get_embedding_usage(self) -> Dict[str, float]:
+        return self.embedding_usage.snapshot()
+
     def get_costs(self) -> float:
         return self.research_costs
 
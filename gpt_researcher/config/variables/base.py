@@ -6,11 +6,25 @@ class BaseConfig(TypedDict):
     RETRIEVER: str
     EMBEDDING: str
     SIMILARITY_THRESHOLD: float
+    SIMILARITY_PERCENTILE: float
+    RETRIEVAL_MODE: str
+    BM25_CANDIDATES: int
+    HYBRID_VECTOR_WEIGHT: float
+    MMR_LAMBDA: float
+    LOCAL_INDEX: bool
+    LOCAL_INDEX_DIR: str
+    ANN_MIN_CHUNKS: int
+    ANN_N_PROBE: int
+    ANN_N_LISTS: int
+    VECTOR_STORE_BATCH_SIZE: int
+    VECTOR_STORE_MAX_PENDING: int
+    VECTOR_STORE_MANIFEST: str
     FAST_LLM: str
     SMART_LLM: str
     STRATEGIC_LLM: str
     FAST_TOKEN_LIMIT: int
     SMART_TOKEN_LIMIT: int
+    SMART_LLM_CONTEXT_WINDOW: int
     BROWSE_CHUNK_MAX_LENGTH: int
     SUMMARY_TOKEN_LIMIT: int
     TEMPERATURE: float
@@ -27,3 +41,13 @@ class BaseConfig(TypedDict):
     MAX_SUBTOPICS: int
     REPORT_SOURCE: Union[str, None]
     DOC_PATH: str
+    FAST_MODE_COMPRESSION: bool
+    RETRIEVER_TIMEOUT: int
+    RETRIEVER_COOLDOWN: int
+    SUB_QUERY_SIMILARITY_THRESHOLD: float
+    STREAM_SUB_QUERIES: bool
+    ADAPTIVE_RESEARCH: bool
+    RESEARCH_CONCURRENCY: int
+    RESEARCH_MIN_INFORMATION_GAIN: float
+    RESEARCH_TOKEN_BUDGET: int
+    CONTEXT_TOKEN_BUDGET: int
@@ -4,11 +4,25 @@ DEFAULT_CONFIG: BaseConfig = {
     "RETRIEVER": "tavily",
     "EMBEDDING": "openai:text-embedding-v2",
     "SIMILARITY_THRESHOLD": 0.42,
+    "SIMILARITY_PERCENTILE": 0,
+    "RETRIEVAL_MODE": "embedding",
+    "BM25_CANDIDATES": 50,
+    "HYBRID_VECTOR_WEIGHT": 0.7,
+    "MMR_LAMBDA": 0.7,
+    "LOCAL_INDEX": False,
+    "LOCAL_INDEX_DIR": "./local-index",
+    "ANN_MIN_CHUNKS": 10000,
+    "ANN_N_PROBE": 8,
+    "ANN_N_LISTS": 0,
+    "VECTOR_STORE_BATCH_SIZE": 64,
+    "VECTOR_STORE_MAX_PENDING": 8,
+    "VECTOR_STORE_MANIFEST": "",
     "FAST_LLM": "openai:qwen-long",
     "SMART_LLM": "openai:qwen-long",
     "STRATEGIC_LLM": "openai:qwen-long",
     "FAST_TOKEN_LIMIT": 2000,
     "SMART_TOKEN_LIMIT": 4000,
+    "SMART_LLM_CONTEXT_WINDOW": 128000,
     "BROWSE_CHUNK_MAX_LENGTH": 8192,
     "CURATE_SOURCES": False,
     "SUMMARY_TOKEN_LIMIT": 700,
@@ -24,5 +38,15 @@ DEFAULT_CONFIG: BaseConfig = {
     "SCRAPER": "bs",
     "MAX_SUBTOPICS": 3,
     "REPORT_SOURCE": "web",
-    "DOC_PATH": "./my-docs"
+    "DOC_PATH": "./my-docs",
+    "FAST_MODE_COMPRESSION": True,
+    "RETRIEVER_TIMEOUT": 20,
+    "RETRIEVER_COOLDOWN": 60,
+    "SUB_QUERY_SIMILARITY_THRESHOLD": 0.9,
+    "STREAM_SUB_QUERIES": False,
+    "ADAPTIVE_RESEARCH": False,
+    "RESEARCH_CONCURRENCY": 2,
+    "RESEARCH_MIN_INFORMATION_GAIN": 0.2,
+    "RESEARCH_TOKEN_BUDGET": 0,
+    "CONTEXT_TOKEN_BUDGET": 25000,
 }
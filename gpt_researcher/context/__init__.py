@@ -1,4 +1,6 @@
+from .chunk_store import ChunkStore
 from .compression import ContextCompressor
 from .retriever import SearchAPIRetriever
+from .section_index import WrittenSectionIndex
 
-__all__ = ['ContextCompressor', 'SearchAPIRetriever']
+__all__ = ['ChunkStore', 'ContextCompressor', 'SearchAPIRetriever', 'WrittenSectionIndex']
@@ -0,0 +1,140 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .ranking import normalize, top_k_by_score
+
+# Vectors are assigned to lists in blocks, so the block-by-centroids similarity matrix stays small
+_ASSIGN_BLOCK = 16384
+# k-means is trained on a sample of this many vectors per list, up to a maximum sample size
+_TRAINING_SAMPLES_PER_LIST = 64
+_MAX_TRAINING_SAMPLES = 131072
+
+
+def default_n_lists(n: int) -> int:
+    """About sqrt(n) lists, each holding at least a few dozen vectors"""
+    return max(1, min(int(math.sqrt(n)), n // 32))
+
+
+class IVFIndex:
+    """
+    Inverted file index over normalized vectors.
+    Vectors are clustered by spherical k-means into `n_lists` lists. A query is compared to the
+    centroids and only the vectors of its `n_probe` closest lists are scored exactly, so a search
+    scores about n_probe / n_lists of the vectors. A larger `n_probe` raises recall and latency.
+
+    The index holds the list of every vector, not the vectors themselves, so it can narrow the
+    rows of a matrix that is stored elsewhere.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        # Number of vectors when the lists were trained
+        self.trained_size = 0
+        self.centroids: Optional[np.ndarray] = None
+        # Rows sorted by list, the rows of list i are order[offsets[i]:offsets[i + 1]]
+        self.order = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _ASSIGN_BLOCK):
+            block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def train(self, vectors: np.ndarray, n_iter: int = 10) -> None:
+        """Clusters a sample of the normalized vectors into the centroids of the lists"""
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists or default_n_lists(len(vectors)), len(vectors))
+        sample_size = min(len(vectors), n_lists * _TRAINING_SAMPLES_PER_LIST, max(n_lists, _MAX_TRAINING_SAMPLES))
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+
+        self.centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = self._assign(sample)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=n_lists)
+            filled = np.flatnonzero(counts)
+            sums = np.add.reduceat(sample[order], np.concatenate(([0], np.cumsum(counts)[:-1]))[filled])
+            self.centroids[filled] = normalize(sums)
+            # Lists left empty restart from random samples
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                self.centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        self.trained_size = len(vectors)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Assigns the normalized vectors, numbered after the vectors already added, to their lists"""
+        if self.centroids is None:
+            raise ValueError("The index must be trained before vectors are added.")
+        assignments = np.concatenate([self._list_of_rows(), self._assign(vectors)])
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))))
+
+    def retain(self, rows: np.ndarray) -> None:
+        """
+        Keeps the indexed rows among the given sorted rows, renumbered in order, e.g. once the chunks
+        of deleted documents are dropped. The lists keep their centroids.
+        """
+        rows = rows[rows < len(self.order)]
+        assignments = self._list_of_rows()[rows]
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))))
+
+    def _list_of_rows(self) -> np.ndarray:
+        assignments = np.empty(len(self.order), dtype=np.int64)
+        if not len(self.order):
+            return assignments
+        assignments[self.order] = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        return assignments
+
+    def candidates(self, query_vector: np.ndarray, n_probe: Optional[int] = None) -> np.ndarray:
+        """Sorted rows of the n_probe lists whose centroids are the most similar to the query"""
+        if self.centroids is None or not len(self.order):
+            return np.empty(0, dtype=np.int64)
+        probes, _ = top_k_by_score(self.centroids @ query_vector, n_probe or self.n_probe)
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probes])
+        return np.sort(rows)
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query_vector: np.ndarray,
+        k: int,
+        n_probe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top k of the indexed vectors by cosine similarity to the query
+        Returns:
+            Rows of the selected vectors and their scores, sorted by descending score
+        """
+        rows = self.candidates(query_vector, n_probe)
+        selected, scores = top_k_by_score(np.asarray(vectors[rows], dtype=np.float32) @ query_vector, k)
+        return rows[selected], scores
+
+    def save(self, file) -> None:
+        np.savez(
+            file,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            params=np.array([self.n_lists or 0, self.n_probe, self.seed, self.trained_size], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, file) -> "IVFIndex":
+        with np.load(file) as data:
+            n_lists, n_probe, seed, trained_size = (int(value) for value in data["params"])
+            index = cls(n_lists=n_lists or None, n_probe=n_probe, seed=seed)
+            index.trained_size = trained_size
+            index.centroids = data["centroids"]
+            index.order = data["order"]
+            index.offsets = data["offsets"]
+        return index
@@ -0,0 +1,82 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Latin words and numbers, or runs of CJK characters which have no spaces between words
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased words for space separated languages, character bigrams for CJK text so that
+    Chinese queries match without a word segmenter
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        if _CJK_PATTERN.match(token) and len(token) > 1:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def term_vector(text: str) -> Dict[str, float]:
+    """L2-normalized term counts of a text, compared with term_similarity"""
+    counts = Counter(tokenize(text))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {term: count / norm for term, count in counts.items()}
+
+
+def term_similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Cosine similarity of two term vectors, the lexical counterpart of the embedding similarity"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+class BM25Index:
+    """In-process Okapi BM25 index that documents can be added to incrementally."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, texts: List[str]) -> None:
+        for text in texts:
+            doc_id = len(self.doc_lengths)
+            tokens = tokenize(text)
+            self.doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+
+    def scores(self, query: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        BM25 score of every document for the query
+        Args:
+            query: Search query
+            rows: When set, only the scores of these documents are returned, in this order
+        """
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        scores = np.zeros(len(doc_lengths), dtype=np.float32)
+        if not len(doc_lengths):
+            return scores
+
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(doc_lengths.mean(), 1e-9))
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            doc_ids, frequencies = np.asarray(postings, dtype=np.int64).T
+            idf = math.log(1 + (len(doc_lengths) - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[doc_ids] += idf * frequencies * (self.k1 + 1) / (frequencies + length_norm[doc_ids])
+
+        return scores if rows is None else scores[rows]
@@ -0,0 +1,398 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from ..memory.embeddings import OPENAI_EMBEDDING_MODEL
+from ..memory.usage import EmbeddingUsageMeter, measure_embedding_usage
+from ..utils.costs import count_tokens
+from ..utils.text_splitter import SentenceTextSplitter
+from .ann import IVFIndex
+from .bm25 import BM25Index
+from .ranking import fuse_scores, mmr_select, normalize, similarity_cutoff, top_k_by_score
+
+RETRIEVAL_MODES = ("embedding", "hybrid", "bm25")
+# MMR picks from this many times max_results of the most relevant chunks
+MMR_CANDIDATES_FACTOR = 4
+
+
+def _page_key(page: Dict) -> str:
+    content = page.get("raw_content") or ""
+    return hashlib.sha256(f"{page.get('url', '')}\n{content}".encode("utf-8")).hexdigest()
+
+
+class ChunkStore:
+    """
+    Per-run store of source chunks of whole sentences, at most `chunk_size` tokens each.
+    Every page is split once and each chunk is embedded at most once into a shared matrix, so
+    researching a sub-query against pages that were already seen costs one query embedding and
+    one matrix-vector product.
+
+    Chunks are ranked by cosine similarity in "embedding" mode and by BM25 alone in "bm25" mode,
+    which needs no embedding call at all. In "hybrid" mode BM25 first narrows the chunks of a
+    query to `bm25_candidates`, only those are embedded, and they are ranked by a weighted sum of
+    both scores.
+
+    For large corpora, e.g. local documents, an IVF index built by `update_ann_index` narrows the
+    chunks scored in "embedding" mode to the lists closest to the query. The store and its index
+    can be saved and loaded again, see local_index.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        chunk_size: int = 300,
+        chunk_overlap: int = 30,
+        retrieval_mode: str = "embedding",
+        bm25_candidates: int = 50,
+        vector_weight: float = 0.7,
+        usage_meter: Optional[EmbeddingUsageMeter] = None,
+    ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Invalid retrieval mode '{retrieval_mode}'. Valid options are: {', '.join(RETRIEVAL_MODES)}."
+            )
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # The splitter counts the tokens of every chunk, the embedding cost of a chunk is then a lookup
+        self.splitter = SentenceTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            model=OPENAI_EMBEDDING_MODEL,
+            add_token_count=True,
+        )
+        self.retrieval_mode = retrieval_mode
+        self.bm25_candidates = bm25_candidates
+        self.vector_weight = vector_weight
+        self.bm25 = BM25Index() if retrieval_mode != "embedding" else None
+        self.usage_meter = usage_meter
+        self.chunks: List[Document] = []
+        self._chunk_ids: Dict[str, int] = {}
+        self._chunk_pages: List[set] = []
+        self._pages: set = set()
+        self._matrix: Optional[np.ndarray] = None
+        self._embedded: set = set()
+        self._embedding: Dict[int, asyncio.Future] = {}
+        self._query_vectors: Dict[str, np.ndarray] = {}
+        self._rows_cache: Optional[tuple] = None
+        self.ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Normalized embeddings of the chunks, one row per chunk, zeros for chunks not embedded yet"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:len(self.chunks)]
+
+    def _split(self, page: Dict) -> List[Document]:
+        document = Document(
+            page_content=page.get("raw_content") or "",
+            metadata={"title": page.get("title", ""), "source": page.get("url", "")},
+        )
+        return self.splitter.split_documents([document])
+
+    def add_pages(self, pages: List[Dict]) -> List[str]:
+        """
+        Splits the pages that are not in the store yet into chunks. The same chunk found in several
+        pages, e.g. a page scraped twice with small changes, is stored once.
+        Returns:
+            The keys of the given pages
+        """
+        keys = []
+        for page in pages:
+            key = _page_key(page)
+            keys.append(key)
+            if key in self._pages:
+                continue
+            self._pages.add(key)
+
+            new_texts = []
+            for chunk in self._split(page):
+                chunk_id = hashlib.sha256(
+                    f"{chunk.metadata['source']}\n{chunk.page_content}".encode("utf-8")
+                ).hexdigest()
+                if chunk_id in self._chunk_ids:
+                    self._chunk_pages[self._chunk_ids[chunk_id]].add(key)
+                    continue
+                chunk.metadata["chunk_id"] = chunk_id
+                self._chunk_ids[chunk_id] = len(self.chunks)
+                self.chunks.append(chunk)
+                self._chunk_pages.append({key})
+                new_texts.append(chunk.page_content)
+
+            if self.bm25 is not None:
+                self.bm25.add(new_texts)
+        return keys
+
+    def rows(self, page_keys: set) -> np.ndarray:
+        """Rows of the chunks belonging to the given pages"""
+        return np.array([i for i, keys in enumerate(self._chunk_pages) if keys & page_keys], dtype=np.int64)
+
+    def _rows_of_pages(self, pages: List[Dict]) -> np.ndarray:
+        # The sub-queries of a research usually search the same list of pages, e.g. all local
+        # documents, hashing and matching them again is skipped while the store is unchanged
+        cached = self._rows_cache
+        if cached is not None and cached[0] is pages and cached[1:3] == (len(pages), len(self.chunks)):
+            return cached[3]
+        rows = self.rows(set(self.add_pages(pages)))
+        self._rows_cache = (pages, len(pages), len(self.chunks), rows)
+        return rows
+
+    def retain_pages(self, page_keys: set) -> bool:
+        """
+        Drops the pages that are not in page_keys and the chunks found only in them, e.g. the
+        documents deleted or changed since the store was saved. Rows are renumbered, the ANN index
+        keeps its lists and only drops the rows of these chunks.
+        Returns:
+            Whether any page was dropped
+        """
+        if self._pages <= page_keys:
+            return False
+        kept = [i for i, keys in enumerate(self._chunk_pages) if keys & page_keys]
+        self.chunks = [self.chunks[i] for i in kept]
+        self._chunk_pages = [self._chunk_pages[i] & page_keys for i in kept]
+        self._chunk_ids = {chunk.metadata["chunk_id"]: i for i, chunk in enumerate(self.chunks)}
+        self._pages &= page_keys
+        if self._matrix is not None:
+            # The matrix may not have rows yet for the last chunks added
+            kept_rows = np.array(kept, dtype=np.int64)
+            matrix = np.zeros((len(kept), self._matrix.shape[1]), dtype=np.float32)
+            in_matrix = kept_rows < len(self._matrix)
+            matrix[in_matrix] = self._matrix[kept_rows[in_matrix]]
+            self._matrix = matrix
+        self._embedded = {new for new, old in enumerate(kept) if old in self._embedded}
+        if self.bm25 is not None:
+            self.bm25 = BM25Index()
+            self.bm25.add([chunk.page_content for chunk in self.chunks])
+        if self.ann is not None:
+            self.ann.retain(np.array(kept, dtype=np.int64))
+        self._rows_cache = None
+        return True
+
+    def _usage_meter(self, cost_callback: Optional[Callable] = None) -> EmbeddingUsageMeter:
+        if self.usage_meter is not None:
+            return self.usage_meter
+        return EmbeddingUsageMeter(cost_callback=cost_callback)
+
+    async def embed(self, rows: np.ndarray, cost_callback: Optional[Callable] = None) -> None:
+        """
+        Embeds the chunks of the given rows that have no vector yet in one batch. Chunks being
+        embedded by a concurrent call are awaited instead of embedded twice. The usage is recorded
+        on the store's usage meter, or reported to cost_callback when the store has none.
+        """
+        missing = [int(row) for row in rows if row not in self._embedded and row not in self._embedding]
+        waiting = {self._embedding[row] for row in rows if row in self._embedding}
+
+        if missing:
+            future = asyncio.get_running_loop().create_future()
+            for row in missing:
+                self._embedding[row] = future
+            try:
+                texts = [self.chunks[row].page_content for row in missing]
+                with measure_embedding_usage() as usage:
+                    vectors = normalize(await asyncio.to_thread(self.embeddings.embed_documents, texts))
+                counted_tokens = sum(self.chunks[row].metadata.get("tokens", 0) for row in missing)
+                self._usage_meter(cost_callback).record(usage, counted_tokens, texts=len(texts))
+                self._store_vectors(missing, vectors)
+                future.set_result(None)
+            except BaseException as e:
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                    # Nobody may be waiting on the future, retrieve the exception so it is not logged
+                    future.exception()
+                else:
+                    future.cancel()
+                raise
+            finally:
+                for row in missing:
+                    self._embedding.pop(row, None)
+
+        if waiting:
+            await asyncio.gather(*waiting)
+
+    async def vectors(self, chunk_ids: List[str], cost_callback: Optional[Callable] = None) -> np.ndarray:
+        """Normalized embeddings of the given chunks, e.g. chunks selected in "bm25" mode are embedded first"""
+        rows = np.array([self._chunk_ids[chunk_id] for chunk_id in chunk_ids], dtype=np.int64)
+        await self.embed(rows, cost_callback=cost_callback)
+        return self._matrix[rows]
+
+    def texts(self, chunk_ids: List[str]) -> List[str]:
+        """Contents of the given chunks"""
+        return [self.chunks[self._chunk_ids[chunk_id]].page_content for chunk_id in chunk_ids]
+
+    def _store_vectors(self, rows: List[int], vectors: np.ndarray) -> None:
+        if self._matrix is None:
+            self._matrix = np.zeros((max(64, len(self.chunks)), vectors.shape[1]), dtype=np.float32)
+        elif len(self._matrix) < len(self.chunks):
+            grown = np.zeros((max(2 * len(self._matrix), len(self.chunks)), self._matrix.shape[1]), dtype=np.float32)
+            grown[:len(self._matrix)] = self._matrix
+            self._matrix = grown
+        self._matrix[rows] = vectors
+        self._embedded.update(rows)
+
+    async def update_ann_index(
+        self,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        cost_callback: Optional[Callable] = None,
+    ) -> None:
+        """
+        Embeds all chunks and indexes them in the IVF index. The lists are trained again when the
+        store has doubled since they were trained, otherwise new chunks join the existing lists.
+        """
+        await self.embed(np.arange(len(self.chunks)), cost_callback=cost_callback)
+        if self.ann is None or len(self.chunks) > 2 * self.ann.trained_size:
+            index = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+            await asyncio.to_thread(index.train, self.matrix)
+            await asyncio.to_thread(index.add, self.matrix)
+            self.ann = index
+        elif len(self.ann) < len(self.chunks):
+            await asyncio.to_thread(self.ann.add, self.matrix[len(self.ann):])
+        self.ann.n_probe = n_probe
+
+    def _ann_rows(self, query_vector: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Narrows the rows to the candidates of the ANN index, rows added after it are all kept"""
+        covered = rows < len(self.ann)
+        candidates = np.intersect1d(self.ann.candidates(query_vector), rows[covered], assume_unique=True)
+        return np.concatenate([candidates, rows[~covered]])
+
+    async def _embed_query(self, query: str, cost_callback: Optional[Callable] = None) -> np.ndarray:
+        if query not in self._query_vectors:
+            with measure_embedding_usage() as usage:
+                self._query_vectors[query] = normalize(await asyncio.to_thread(self.embeddings.embed_query, query))
+            self._usage_meter(cost_callback).record(usage, count_tokens(query, OPENAI_EMBEDDING_MODEL))
+        return self._query_vectors[query]
+
+    async def search(
+        self,
+        query: str,
+        pages: List[Dict],
+        similarity_threshold: float,
+        max_results: int = 10,
+        percentile: Optional[float] = None,
+        cost_callback: Optional[Callable] = None,
+        mmr_lambda: float = 1.0,
+        exclude_chunk_ids: Optional[set] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Returns the chunks of the given pages most relevant to the query with their score, sorted by
+        descending score. The score is the cosine similarity, the BM25 score in "bm25" mode or the
+        fused score in "hybrid" mode. See similarity_cutoff for the threshold and percentile, which
+        apply to the cosine similarity.
+
+        With mmr_lambda below 1 the chunks are selected by maximal marginal relevance among the
+        most relevant ones instead, in selection order, so near-duplicate chunks are skipped. MMR
+        needs the chunk embeddings and does not apply in "bm25" mode.
+
+        Chunks whose ID is in exclude_chunk_ids, e.g. already in the context of a previous subtopic,
+        are neither embedded nor returned.
+        """
+        rows = self._rows_of_pages(pages)
+        if exclude_chunk_ids:
+            excluded = [self._chunk_ids[chunk_id] for chunk_id in exclude_chunk_ids if chunk_id in self._chunk_ids]
+            if excluded:
+                rows = rows[~np.isin(rows, excluded)]
+        if not len(rows):
+            return []
+
+        if self.retrieval_mode == "bm25":
+            lexical = self.bm25.scores(query, rows)
+            matching = np.flatnonzero(lexical > 0)
+            selected, scores = top_k_by_score(lexical[matching], max_results)
+            return [(self.chunks[i], float(score)) for i, score in zip(rows[matching][selected], scores)]
+
+        lexical = None
+        if self.retrieval_mode == "hybrid":
+            lexical = self.bm25.scores(query, rows)
+            if self.bm25_candidates and len(rows) > self.bm25_candidates:
+                # The cheap lexical stage narrows the chunks that need an embedding
+                candidates = np.argpartition(-lexical, self.bm25_candidates - 1)[:self.bm25_candidates]
+                rows, lexical = rows[candidates], lexical[candidates]
+
+        if self.ann is not None and lexical is None:
+            rows = self._ann_rows(await self._embed_query(query, cost_callback), rows)
+            if not len(rows):
+                return []
+
+        await self.embed(rows, cost_callback=cost_callback)
+        query_vector = await self._embed_query(query, cost_callback)
+        # Searching all chunks of the run is the common case, the full matrix needs no row gather
+        matrix = self.matrix if len(rows) == len(self.matrix) else self.matrix[rows]
+        similarities = matrix @ query_vector
+        cutoff = similarity_cutoff(similarities, similarity_threshold, percentile)
+
+        relevant = np.flatnonzero(similarities >= cutoff)
+        relevance = similarities[relevant]
+        if lexical is not None:
+            relevance = fuse_scores(relevance, lexical[relevant], self.vector_weight)
+
+        if mmr_lambda >= 1:
+            selected, scores = top_k_by_score(relevance, max_results)
+        else:
+            candidates, _ = top_k_by_score(relevance, max_results * MMR_CANDIDATES_FACTOR)
+            mmr_selected, scores = mmr_select(
+                relevance[candidates], matrix[relevant[candidates]], max_results, mmr_lambda
+            )
+            selected = candidates[mmr_selected]
+        return [(self.chunks[i], float(score)) for i, score in zip(rows[relevant[selected]], scores)]
+
+    def save(self, path: str) -> None:
+        """Writes the chunks, their embeddings as float16 and the ANN index to the directory"""
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "chunks.jsonl.tmp"), "w", encoding="utf-8") as f:
+            for chunk, pages in zip(self.chunks, self._chunk_pages):
+                f.write(json.dumps(
+                    {"content": chunk.page_content, "metadata": chunk.metadata, "pages": sorted(pages)},
+                    ensure_ascii=False,
+                ) + "\n")
+        os.replace(os.path.join(path, "chunks.jsonl.tmp"), os.path.join(path, "chunks.jsonl"))
+
+        embedded = np.zeros(len(self.chunks), dtype=bool)
+        embedded[list(self._embedded)] = True
+        matrix = self.matrix if self._matrix is not None else np.empty((len(self.chunks), 0), dtype=np.float32)
+        with open(os.path.join(path, "vectors.npz.tmp"), "wb") as f:
+            np.savez(f, vectors=matrix.astype(np.float16), embedded=embedded)
+        os.replace(os.path.join(path, "vectors.npz.tmp"), os.path.join(path, "vectors.npz"))
+
+        ann_path = os.path.join(path, "ivf.npz")
+        if self.ann is not None:
+            with open(ann_path + ".tmp", "wb") as f:
+                self.ann.save(f)
+            os.replace(ann_path + ".tmp", ann_path)
+        elif os.path.exists(ann_path):
+            os.remove(ann_path)
+
+    @classmethod
+    def load(cls, path: str, embeddings, **kwargs) -> "ChunkStore":
+        """Reads a store written by save, kwargs are the ChunkStore arguments"""
+        store = cls(embeddings, **kwargs)
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                chunk = Document(page_content=record["content"], metadata=record["metadata"])
+                store._chunk_ids[chunk.metadata["chunk_id"]] = len(store.chunks)
+                store.chunks.append(chunk)
+                store._chunk_pages.append(set(record["pages"]))
+                store._pages.update(record["pages"])
+
+        with np.load(os.path.join(path, "vectors.npz")) as data:
+            vectors, embedded = data["vectors"], data["embedded"]
+        if len(vectors) != len(store.chunks) or len(embedded) != len(store.chunks):
+            raise ValueError(f"The chunks and vectors saved in {path} do not match.")
+        if vectors.shape[1]:
+            store._matrix = vectors.astype(np.float32)
+            store._embedded = set(np.flatnonzero(embedded).tolist())
+
+        if store.bm25 is not None:
+            store.bm25.add([chunk.page_content for chunk in store.chunks])
+        if os.path.exists(os.path.join(path, "ivf.npz")) and store.retrieval_mode == "embedding":
+            store.ann = IVFIndex.load(os.path.join(path, "ivf.npz"))
+        return store
@@ -1,7 +1,8 @@
-import os
 import asyncio
-from typing import Optional
-from .retriever import SearchAPIRetriever, SectionRetriever
+from typing import List, Optional, Set
+from .chunk_store import ChunkStore
+from ..config import Config
+from .retriever import SectionRetriever
 from langchain.retrievers import (
     ContextualCompressionRetriever,
 )
@@ -9,9 +10,10 @@ from langchain.retrievers.document_compressors import (
     DocumentCompressorPipeline,
     EmbeddingsFilter,
 )
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from ..vector_store import VectorStoreWrapper
-from ..utils.costs import estimate_embedding_cost
+from ..memory.usage import EmbeddingUsageMeter, measure_embedding_usage
+from ..utils.costs import count_tokens
+from ..utils.text_splitter import SentenceTextSplitter
 from ..memory.embeddings import OPENAI_EMBEDDING_MODEL
 
 
@@ -34,29 +36,51 @@ class VectorstoreCompressor:
         results = await self.vector_store.asimilarity_search(query=query, k=max_results, filter=self.filter)
         return self.__pretty_print_docs(results)
 
+    async def async_get_contexts(self, queries: List[str], max_results=5) -> List[str]:
+        """
+        Get the relevant context of each query from vector store with one batched search
+        A document found by several queries is only in the context of the first one
+        """
+        results = await self.vector_store.asimilarity_search_batch(queries, k=max_results, filter=self.filter)
+        seen = set()
+        contexts = []
+        for documents in results:
+            unique_documents = []
+            for document in documents:
+                key = (document.metadata.get("source"), document.page_content)
+                if key not in seen:
+                    seen.add(key)
+                    unique_documents.append(document)
+            contexts.append(self.__pretty_print_docs(unique_documents))
+        return contexts
+
 
 class ContextCompressor:
-    def __init__(self, documents, embeddings, max_results=5, **kwargs):
+    def __init__(
+        self,
+        documents,
+        embeddings,
+        max_results=5,
+        chunk_store: Optional[ChunkStore] = None,
+        similarity_threshold: Optional[float] = None,
+        similarity_percentile: Optional[float] = None,
+        mmr_lambda: float = 1.0,
+        exclude_chunk_ids: Optional[Set[str]] = None,
+        **kwargs,
+    ):
         self.max_results = max_results
         self.documents = documents
         self.kwargs = kwargs
         self.embeddings = embeddings
-        self.similarity_threshold = os.environ.get("SIMILARITY_THRESHOLD", 0.35)
-
-    def __get_contextual_retriever(self):
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        relevance_filter = EmbeddingsFilter(embeddings=self.embeddings,
-                                            similarity_threshold=self.similarity_threshold)
-        pipeline_compressor = DocumentCompressorPipeline(
-            transformers=[splitter, relevance_filter]
-        )
-        base_retriever = SearchAPIRetriever( #内容、题目、链接
-            pages=self.documents
-        )
-        contextual_retriever = ContextualCompressionRetriever(
-            base_compressor=pipeline_compressor, base_retriever=base_retriever
-        )
-        return contextual_retriever
+        # Without a shared chunk store the documents are split and embedded for this query only
+        self.chunk_store = chunk_store if chunk_store is not None else ChunkStore(embeddings)
+        if similarity_threshold is None:
+            similarity_threshold = Config().similarity_threshold
+        self.similarity_threshold = similarity_threshold
+        self.similarity_percentile = similarity_percentile
+        self.mmr_lambda = mmr_lambda
+        # IDs of the chunks already in the context, e.g. of a previous subtopic, that are not searched
+        self.exclude_chunk_ids = exclude_chunk_ids
 
     def __pretty_print_docs(self, docs, top_n):
         return f"\n".join(f"Source: {d.metadata.get('source')}\n"
@@ -64,23 +88,50 @@ class ContextCompressor:
                           f"Content: {d.page_content}\n"
                           for i, d in enumerate(docs) if i < top_n)
 
-    async def async_get_context(self, query, max_results=5, cost_callback=None):
-        compressed_docs = self.__get_contextual_retriever()
-        if cost_callback:
-            cost_callback(estimate_embedding_cost(model=OPENAI_EMBEDDING_MODEL, docs=self.documents))
-        relevant_docs = await asyncio.to_thread(compressed_docs.invoke, query)
-        return self.__pretty_print_docs(relevant_docs, max_results)
+    async def async_get_context(self, query, max_results=5, cost_callback=None, chunk_callback=None):
+        # Chunks already embedded for another sub-query are reused, only new pages are embedded
+        results = await self.chunk_store.search(
+            query,
+            self.documents,
+            self.similarity_threshold,
+            max_results,
+            percentile=self.similarity_percentile,
+            cost_callback=cost_callback,
+            mmr_lambda=self.mmr_lambda,
+            exclude_chunk_ids=self.exclude_chunk_ids,
+        )
+        if chunk_callback:
+            chunk_callback([
+                {
+                    "chunk_id": d.metadata.get("chunk_id"),
+                    "query": query,
+                    "score": score,
+                    "source": d.metadata.get("source"),
+                    "title": d.metadata.get("title"),
+                    "content": d.page_content,
+                }
+                for d, score in results
+            ])
+        return self.__pretty_print_docs([d for d, _ in results], max_results)
 
 
 class WrittenContentCompressor:
-    def __init__(self, documents, embeddings, similarity_threshold, **kwargs):
+    def __init__(
+        self,
+        documents,
+        embeddings,
+        similarity_threshold,
+        usage_meter: Optional[EmbeddingUsageMeter] = None,
+        **kwargs,
+    ):
         self.documents = documents
         self.kwargs = kwargs
         self.embeddings = embeddings
         self.similarity_threshold = similarity_threshold
+        self.usage_meter = usage_meter
 
     def __get_contextual_retriever(self):
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        splitter = SentenceTextSplitter(chunk_size=300, chunk_overlap=30, model=OPENAI_EMBEDDING_MODEL)
         relevance_filter = EmbeddingsFilter(embeddings=self.embeddings,
                                             similarity_threshold=self.similarity_threshold)
         pipeline_compressor = DocumentCompressorPipeline(
@@ -99,7 +150,13 @@ class WrittenContentCompressor:
 
     async def async_get_context(self, query, max_results=5, cost_callback=None):
         compressed_docs = self.__get_contextual_retriever()
-        if cost_callback:
-            cost_callback(estimate_embedding_cost(model=OPENAI_EMBEDDING_MODEL, docs=self.documents))
-        relevant_docs = await asyncio.to_thread(compressed_docs.invoke, query)
+        with measure_embedding_usage() as usage:
+            relevant_docs = await asyncio.to_thread(compressed_docs.invoke, query)
+        # The sections are split and embedded along with the query, their tokens are counted when
+        # the provider reports no usage
+        texts = [section.get("written_content", "") for section in self.documents] + [query]
+        usage_meter = self.usage_meter or EmbeddingUsageMeter(cost_callback=cost_callback)
+        usage_meter.record(
+            usage, sum(count_tokens(text, OPENAI_EMBEDDING_MODEL) for text in texts), texts=len(texts)
+        )
         return self.__pretty_docs_list(relevant_docs, max_results)
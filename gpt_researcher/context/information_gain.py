@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .bm25 import term_similarity, term_vector
+from .chunk_store import ChunkStore
+
+
+class InformationGainTracker:
+    """
+    Measures how much new information each researched sub-query adds to the context pool.
+    A chunk is novel when its cosine similarity to every chunk already in the pool is below
+    `novelty_threshold`; the information gain of a sub-query is its share of novel chunks.
+    The vectors of the chunks are read from the chunk store the sub-queries were searched in, or
+    are the term vectors of the chunks in "bm25" mode so that no chunk is embedded.
+    """
+
+    def __init__(self, chunk_store: ChunkStore, novelty_threshold: float = 0.85):
+        self.chunk_store = chunk_store
+        self.novelty_threshold = novelty_threshold
+        self.lexical = chunk_store.retrieval_mode == "bm25"
+        self._pool: Optional[np.ndarray] = None
+        self._term_pool: List[Dict[str, float]] = []
+
+    @property
+    def size(self) -> int:
+        if self.lexical:
+            return len(self._term_pool)
+        return 0 if self._pool is None else len(self._pool)
+
+    async def add(self, chunk_ids: List[str]) -> float:
+        """
+        Adds the novel chunks selected for a sub-query to the pool
+        Returns:
+            The information gain between 0 and 1, 0 when no chunk was selected
+        """
+        if not chunk_ids:
+            return 0.0
+
+        if self.lexical:
+            return self._add_lexical(chunk_ids)
+
+        vectors = await self.chunk_store.vectors(chunk_ids)
+        if self._pool is None:
+            novel = np.ones(len(vectors), dtype=bool)
+        else:
+            novel = (vectors @ self._pool.T).max(axis=1) < self.novelty_threshold
+
+        if novel.any():
+            new_vectors = vectors[novel]
+            self._pool = new_vectors if self._pool is None else np.vstack([self._pool, new_vectors])
+
+        return float(novel.mean())
+
+    def _add_lexical(self, chunk_ids: List[str]) -> float:
+        vectors = [term_vector(text) for text in self.chunk_store.texts(chunk_ids)]
+        novel = [
+            all(term_similarity(vector, pooled) < self.novelty_threshold for pooled in self._term_pool)
+            for vector in vectors
+        ]
+        self._term_pool.extend(vector for vector, is_novel in zip(vectors, novel) if is_novel)
+        return sum(novel) / len(novel)
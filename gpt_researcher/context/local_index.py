@@ -0,0 +1,88 @@
+"""
+Persistent chunk store of the local documents in DOC_PATH.
+
+The chunks of the documents, their embeddings and the ANN index are saved in a folder of
+LOCAL_INDEX_DIR named after the absolute DOC_PATH, next to a manifest.json describing them. The
+documents folder itself is never written to. A later research on the same folder only splits and
+embeds the documents that changed, and drops the chunks of the documents that were deleted.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from .chunk_store import ChunkStore
+
+MANIFEST_VERSION = 1
+
+
+def local_index_path(doc_path: str, index_dir: str) -> str:
+    """Folder of the chunk store of the documents in doc_path"""
+    doc_key = hashlib.sha256(os.path.abspath(doc_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(index_dir, doc_key)
+
+
+def read_manifest(doc_path: str, index_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(local_index_path(doc_path, index_dir), "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_local_chunk_store(doc_path: str, index_dir: str, embeddings, embedding: str, **kwargs) -> Optional[ChunkStore]:
+    """
+    Loads the chunk store saved for DOC_PATH, or returns None when there is none or when it was
+    built with another embedding model or chunk size.
+    Args:
+        doc_path: Folder of the local documents
+        index_dir: Folder of the saved chunk stores, LOCAL_INDEX_DIR
+        embeddings: Embeddings of the store
+        embedding: Provider and model of the embeddings, e.g. "openai:text-embedding-3-small"
+        kwargs: ChunkStore arguments
+    """
+    manifest = read_manifest(doc_path, index_dir)
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    if manifest.get("embedding") != embedding:
+        return None
+
+    try:
+        store = ChunkStore.load(local_index_path(doc_path, index_dir), embeddings, **kwargs)
+    except (OSError, ValueError, KeyError):
+        return None
+    if (store.chunk_size, store.chunk_overlap, len(store)) != (
+        manifest.get("chunk_size"), manifest.get("chunk_overlap"), manifest.get("chunks")
+    ):
+        return None
+    return store
+
+
+def save_local_chunk_store(store: ChunkStore, doc_path: str, index_dir: str, embedding: str) -> None:
+    """Saves the chunk store of DOC_PATH in LOCAL_INDEX_DIR and writes its manifest last"""
+    path = local_index_path(doc_path, index_dir)
+    # Without a manifest a save interrupted half-way is never loaded
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        os.remove(os.path.join(path, "manifest.json"))
+    store.save(path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "embedding": embedding,
+        "doc_path": os.path.abspath(doc_path),
+        "chunk_size": store.chunk_size,
+        "chunk_overlap": store.chunk_overlap,
+        "chunks": len(store),
+        "embedded_chunks": len(store._embedded),
+        "documents": len(store._pages),
+        "ann": {
+            "type": "ivf",
+            "lists": len(store.ann.centroids),
+            "indexed_chunks": len(store.ann),
+            "trained_size": store.ann.trained_size,
+        } if store.ann is not None else None,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(path, "manifest.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(path, "manifest.json.tmp"), os.path.join(path, "manifest.json"))
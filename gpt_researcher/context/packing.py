@@ -0,0 +1,150 @@
+from typing import Any, Dict, List, Set, Tuple
+
+from ..utils.costs import count_tokens, get_encoding
+
+
+def format_chunk(chunk: Dict[str, Any]) -> str:
+    """Formats a research chunk the same way the compressors print their documents"""
+    return f"Source: {chunk.get('source')}\nTitle: {chunk.get('title')}\nContent: {chunk.get('content')}\n"
+
+
+def assign_chunks(
+    candidates: Dict[str, List[Dict[str, Any]]],
+    max_results: int,
+    exclude_chunk_ids: Set[str] = frozenset(),
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Assigns the candidate chunks of concurrent sub-queries so every chunk is in the context of one
+    sub-query only, the one it scores best for, whatever order the sub-queries finished in.
+    A sub-query whose best chunks went to other sub-queries is filled with its next candidates.
+    Args:
+        candidates: Research chunks of each sub-query in rank order, more than max_results to fill from
+        max_results: Maximum number of chunks assigned to a sub-query
+        exclude_chunk_ids: Chunks already in the context, never assigned
+    Returns:
+        The chunks assigned to each sub-query, in rank order
+    """
+    # Ties go to the sub-query listed first
+    owners: Dict[str, str] = {}
+    best_scores: Dict[str, float] = {}
+    for query, chunks in candidates.items():
+        for chunk in chunks:
+            chunk_id = chunk["chunk_id"]
+            if chunk_id not in best_scores or chunk["score"] > best_scores[chunk_id]:
+                owners[chunk_id] = query
+                best_scores[chunk_id] = chunk["score"]
+
+    assigned: Dict[str, List[Dict[str, Any]]] = {query: [] for query in candidates}
+    taken = set(exclude_chunk_ids)
+    for query, chunks in candidates.items():
+        for chunk in chunks:
+            if len(assigned[query]) < max_results and owners[chunk["chunk_id"]] == query and chunk["chunk_id"] not in taken:
+                assigned[query].append(chunk)
+                taken.add(chunk["chunk_id"])
+
+    for query, chunks in candidates.items():
+        for chunk in chunks:
+            if len(assigned[query]) >= max_results:
+                break
+            if chunk["chunk_id"] not in taken:
+                assigned[query].append(chunk)
+                taken.add(chunk["chunk_id"])
+        rank = {id(chunk): i for i, chunk in enumerate(chunks)}
+        assigned[query].sort(key=lambda chunk: rank[id(chunk)])
+    return assigned
+
+
+def pack_chunks(chunks: List[Dict[str, Any]], token_budget: int) -> Tuple[List[str], int]:
+    """
+    Packs the highest-scoring unique research chunks into a token budget.
+    Every sub-query first gets an equal share of the budget so none of them is crowded out, then
+    the budget left by sub-queries with few relevant chunks goes to the best remaining chunks.
+    Args:
+        chunks: Research chunks with chunk_id, query, score, source, title and content
+        token_budget: Maximum number of tokens of the packed context
+    Returns:
+        The context as one string per sub-query, like the research context, and its token count
+    """
+    # A chunk can be selected by several sub-queries, it is packed once under its best score
+    best: Dict[str, Dict[str, Any]] = {}
+    by_query: Dict[str, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        query_chunks = by_query.setdefault(chunk["query"], [])
+        if all(c["chunk_id"] != chunk["chunk_id"] for c in query_chunks):
+            query_chunks.append(chunk)
+        if chunk["chunk_id"] not in best or chunk["score"] > best[chunk["chunk_id"]]["score"]:
+            best[chunk["chunk_id"]] = chunk
+    if not best:
+        return [], 0
+
+    tokens = {chunk_id: count_tokens(format_chunk(chunk)) for chunk_id, chunk in best.items()}
+    packed: Dict[str, List[Dict[str, Any]]] = {query: [] for query in by_query}
+    used = 0
+
+    share = token_budget // len(by_query)
+    for query, query_chunks in by_query.items():
+        spent = 0
+        for chunk in sorted(query_chunks, key=lambda c: -c["score"]):
+            chunk_id = chunk["chunk_id"]
+            if chunk_id in tokens and spent + tokens[chunk_id] <= share:
+                packed[query].append(chunk)
+                spent += tokens.pop(chunk_id)
+        used += spent
+
+    for chunk_id in sorted(tokens, key=lambda chunk_id: -best[chunk_id]["score"]):
+        if used + tokens[chunk_id] <= token_budget:
+            packed[best[chunk_id]["query"]].append(best[chunk_id])
+            used += tokens[chunk_id]
+
+    context = [
+        "\n".join(format_chunk(chunk) for chunk in sorted(query_chunks, key=lambda c: -c["score"]))
+        for query_chunks in packed.values()
+        if query_chunks
+    ]
+    return context, used
+
+
+def pack_labeled_chunks(chunks: List[Dict[str, Any]], token_budget: int, labels: Dict[str, str]) -> Tuple[str, int]:
+    """
+    Packs research chunks gathered from several origins, e.g. local documents and the web, each
+    under its label. Every origin gets a share of the budget by its number of sub-queries, the
+    budget an origin does not use goes to the next one.
+    Args:
+        chunks: Research chunks with an origin among the keys of labels
+        token_budget: Maximum number of tokens of the packed context
+        labels: Label of the context of each origin, in packing order
+    Returns:
+        The context with one labeled section per origin, and its token count
+    """
+    by_origin = {origin: [chunk for chunk in chunks if chunk.get("origin") == origin] for origin in labels}
+    queries = {origin: len({chunk["query"] for chunk in origin_chunks}) for origin, origin_chunks in by_origin.items()}
+    remaining_queries = sum(queries.values())
+
+    sections = []
+    used = 0
+    for origin, label in labels.items():
+        share = (token_budget - used) * queries[origin] // remaining_queries if remaining_queries else 0
+        remaining_queries -= queries[origin]
+        context, origin_used = pack_chunks(by_origin[origin], share)
+        sections.append(f"{label}: {context}")
+        used += origin_used
+    return "\n\n".join(sections), used
+
+
+def truncate_to_tokens(content: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        if count_tokens(content) <= max_tokens:
+            return content
+        return content.encode("utf-8")[:max_tokens * 4].decode("utf-8", "ignore")
+    tokens = encoding.encode(content, disallowed_special=())
+    return content if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def truncate_context(context, token_budget: int):
+    """Trims a context string, or each string of a context list equally, to fit the token budget"""
+    if isinstance(context, str):
+        return truncate_to_tokens(context, token_budget)
+    if isinstance(context, list) and context and count_tokens(str(context)) > token_budget:
+        return [truncate_to_tokens(str(item), token_budget // len(context)) for item in context]
+    return context
@@ -0,0 +1,107 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalizes a vector or the rows of a matrix as float32"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k_by_score(scores: np.ndarray, k: int, min_score: float = -np.inf) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the k highest scores at or above min_score with argpartition
+    Returns:
+        Indices of the selected scores and the scores, sorted by descending score
+    """
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    candidates = np.flatnonzero(scores >= min_score)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return candidates, scores[candidates]
+
+
+def similarity_cutoff(scores: np.ndarray, similarity_threshold: float, percentile: Optional[float] = None) -> float:
+    """
+    The similarity threshold, raised to the given percentile of the scores when set, so only chunks
+    standing out from the rest are kept when all of them are loosely related
+    """
+    if percentile and len(scores):
+        return max(similarity_threshold, float(np.percentile(scores, percentile)))
+    return similarity_threshold
+
+
+def top_k_by_similarity(
+    query_vector: np.ndarray,
+    matrix: np.ndarray,
+    k: int,
+    similarity_threshold: float = 0.0,
+    percentile: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scores every row of a normalized matrix against a normalized query vector with one matmul and
+    selects the k best rows at or above the threshold.
+    Args:
+        query_vector: Normalized query embedding
+        matrix: Normalized chunk embeddings, one row per chunk
+        k: Maximum number of rows to return
+        similarity_threshold: Minimum cosine similarity
+        percentile: See similarity_cutoff
+    Returns:
+        Indices of the selected rows and their scores, sorted by descending score
+    """
+    if not len(matrix):
+        return top_k_by_score(np.empty(0, dtype=np.float32), k)
+    scores = matrix @ query_vector
+    return top_k_by_score(scores, k, similarity_cutoff(scores, similarity_threshold, percentile))
+
+
+def fuse_scores(vector_scores: np.ndarray, lexical_scores: np.ndarray, vector_weight: float = 0.7) -> np.ndarray:
+    """Weighted sum of cosine similarities and BM25 scores scaled to [0, 1] by the best BM25 score"""
+    best_lexical = float(lexical_scores.max()) if len(lexical_scores) else 0.0
+    lexical = lexical_scores / best_lexical if best_lexical > 0 else np.zeros_like(vector_scores)
+    return vector_weight * vector_scores + (1 - vector_weight) * lexical
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maximal marginal relevance: greedily selects the candidate with the best trade-off between its
+    relevance and its cosine similarity to the candidates already selected.
+    Args:
+        relevance: Relevance score of each candidate to the query
+        vectors: Normalized embeddings of the candidates, one row per candidate
+        k: Maximum number of candidates to select
+        lambda_mult: 1 selects by relevance only, 0 by diversity only
+    Returns:
+        Indices of the selected candidates in selection order and their relevance scores
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    selected = [int(np.argmax(relevance))]
+    # Similarity of every candidate to its closest selected candidate, updated with one
+    # matrix-vector product per selection
+    redundancy = vectors @ vectors[selected[0]]
+    available = np.ones(len(relevance), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+    selected = np.array(selected, dtype=np.int64)
+    return selected, relevance[selected]
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from ..memory.embeddings import OPENAI_EMBEDDING_MODEL, embed_queries
+from ..memory.usage import EmbeddingUsageMeter, measure_embedding_usage
+from ..utils.costs import count_tokens
+from ..utils.text_splitter import SentenceTextSplitter
+from .ranking import normalize, top_k_by_score
+
+
+class WrittenSectionIndex:
+    """
+    Incremental index of the sections already written in a detailed report.
+    Sections are split and embedded once when they are added, so looking up what was written
+    before a new subtopic costs one query embedding per draft section title and one matrix
+    product, however long the report has grown.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        chunk_size: int = 300,
+        chunk_overlap: int = 30,
+        usage_meter: Optional[EmbeddingUsageMeter] = None,
+    ):
+        self.embeddings = embeddings
+        self.splitter = SentenceTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            model=OPENAI_EMBEDDING_MODEL,
+            add_token_count=True,
+        )
+        self.usage_meter = usage_meter or EmbeddingUsageMeter()
+        self.chunks: List[Document] = []
+        self._chunk_ids: set = set()
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    async def add_sections(self, sections: List[Dict]) -> None:
+        """Splits and embeds the chunks of the sections, written by extract_sections, not indexed yet"""
+        documents = [
+            Document(
+                page_content=section.get("written_content", ""),
+                metadata={"section_title": section.get("section_title", "")},
+            )
+            for section in sections
+        ]
+        new_chunks: Dict[str, Document] = {}
+        for chunk in self.splitter.split_documents(documents):
+            chunk_id = hashlib.sha256(
+                f"{chunk.metadata['section_title']}\n{chunk.page_content}".encode("utf-8")
+            ).hexdigest()
+            if chunk_id not in self._chunk_ids:
+                new_chunks[chunk_id] = chunk
+        if not new_chunks:
+            return
+
+        texts = [chunk.page_content for chunk in new_chunks.values()]
+        with measure_embedding_usage() as usage:
+            vectors = normalize(await asyncio.to_thread(self.embeddings.embed_documents, texts))
+        self.usage_meter.record(
+            usage, sum(chunk.metadata["tokens"] for chunk in new_chunks.values()), texts=len(texts)
+        )
+        self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+        self.chunks.extend(new_chunks.values())
+        self._chunk_ids.update(new_chunks)
+
+    async def search(
+        self,
+        queries: List[str],
+        similarity_threshold: float = 0.5,
+        max_results: int = 10,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Returns, for each query, the written chunks most similar to it with their cosine similarity,
+        sorted by descending similarity. The queries are embedded concurrently as search queries.
+        """
+        if not queries or not self.chunks:
+            return [[] for _ in queries]
+
+        with measure_embedding_usage() as usage:
+            query_vectors = normalize(await embed_queries(self.embeddings, queries))
+        self.usage_meter.record(
+            usage, sum(count_tokens(query, OPENAI_EMBEDDING_MODEL) for query in queries), texts=len(queries)
+        )
+
+        similarities = self._matrix @ query_vectors.T
+        results = []
+        for column in similarities.T:
+            selected, scores = top_k_by_score(column, max_results, similarity_threshold)
+            results.append([(self.chunks[i], float(score)) for i, score in zip(selected, scores)])
+        return results
@@ -140,6 +140,12 @@ class GenericLLMProvider:
 
         return response
 
+    async def stream_chunks(self, messages):
+        """Yields the text chunks of the response as the model generates them"""
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
+
     async def _send_output(self, content, websocket=None):
         if websocket is not None:
             await websocket.send_json({"type": "report", "output": content})
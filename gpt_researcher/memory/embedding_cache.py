@@ -0,0 +1,317 @@
+"""
+Persistent embedding cache shared by all research runs and processes of a machine.
+
+With EMBEDDING_CACHE=true the embeddings returned by `Memory.get_embeddings()` look every text up
+by (provider, model, sha256(text)) in EMBEDDING_CACHE_DIR before calling the provider, and only
+the misses are sent to the provider in one batch. Vectors are stored as memory-mapped float16
+arrays, one file per provider and model, indexed by a SQLite database. When the cache grows over
+EMBEDDING_CACHE_MAX_MB the least recently used vectors are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..utils.costs import count_tokens
+from .usage import measure_embedding_usage, report_embedding_usage
+
+# Evicting frees space down to this fraction of the limit, so eviction does not run on every write
+_EVICTION_TARGET = 0.8
+_SQLITE_MAX_VARIABLES = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """
+    On-disk store of float16 embedding vectors keyed by namespace and text hash.
+
+    Several processes can share the store. Writers take SQLite's write lock with BEGIN IMMEDIATE
+    before touching a vector file, and appends start at the row after the last one in the file.
+    Compaction writes the kept vectors to a new file and deletes the old one once the index points
+    to the new one. Readers map the file named in the index they read, so they never read rows
+    of another file, and they remap when the file of a namespace changed.
+    """
+
+    def __init__(self, path: str = "./embedding-cache", max_bytes: int = 1024 * 1024 * 1024):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._maps: Dict[str, np.memmap] = {}
+        # Writers of other processes hold the write lock for one append or compaction at most
+        self._db = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS namespaces (namespace TEXT PRIMARY KEY, file TEXT, dim INTEGER, rows INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT, hash TEXT, row INTEGER, last_used REAL, PRIMARY KEY (namespace, hash))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        """A transaction of the index, IMMEDIATE ones are serialized with the writers of every process"""
+        self._db.execute(f"BEGIN {mode}")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _namespace(self, namespace: str) -> Optional[tuple]:
+        return self._db.execute(
+            "SELECT file, dim, rows FROM namespaces WHERE namespace = ?", (namespace,)
+        ).fetchone()
+
+    def _map(self, namespace: str, file: str, dim: int, rows: int) -> np.memmap:
+        """Maps the rows of the namespace file, again when the file was compacted or has grown"""
+        path = os.path.join(self.path, file)
+        mapped = self._maps.get(namespace)
+        if mapped is None or mapped.filename != os.path.abspath(path) or len(mapped) < rows:
+            mapped = np.memmap(path, dtype=np.float16, mode="r", shape=(rows, dim))
+            self._maps[namespace] = mapped
+        return mapped
+
+    def get(self, namespace: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors of the given hashes, as float32 arrays"""
+        hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            vectors = self._read(namespace, hashes)
+            self.hits += len(vectors)
+            self.misses += len(hashes) - len(vectors)
+            if vectors:
+                now = time.time()
+                with self._transaction():
+                    self._db.executemany(
+                        "UPDATE entries SET last_used = ? WHERE namespace = ? AND hash = ?",
+                        [(now, namespace, h) for h in vectors],
+                    )
+            return vectors
+
+    def _read(self, namespace: str, hashes: List[str], attempts: int = 3) -> Dict[str, np.ndarray]:
+        for _ in range(attempts):
+            try:
+                # The rows and the file they belong to are read from the same snapshot of the index
+                with self._transaction("DEFERRED"):
+                    info = self._namespace(namespace)
+                    if info is None:
+                        return {}
+                    rows = {}
+                    for i in range(0, len(hashes), _SQLITE_MAX_VARIABLES):
+                        batch = hashes[i:i + _SQLITE_MAX_VARIABLES]
+                        rows.update(self._db.execute(
+                            f"SELECT hash, row FROM entries WHERE namespace = ? AND hash IN ({','.join('?' * len(batch))})",
+                            (namespace, *batch),
+                        ).fetchall())
+                    if not rows:
+                        return {}
+                    mapped = self._map(namespace, *info)
+                    return {h: np.asarray(mapped[row], dtype=np.float32) for h, row in rows.items()}
+            except FileNotFoundError:
+                # Another process compacted the namespace after the snapshot was taken, read it again
+                self._maps.pop(namespace, None)
+        return {}
+
+    def put(self, namespace: str, hashes: List[str], vectors: np.ndarray) -> None:
+        """Appends the vectors of the given hashes to the namespace file"""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if not len(hashes) or vectors.ndim != 2:
+            return
+
+        with self._lock:
+            with self._transaction():
+                info = self._namespace(namespace)
+                if info is None:
+                    info = (f"{text_hash(namespace)[:16]}.f16", vectors.shape[1], 0)
+                    self._db.execute(
+                        "INSERT INTO namespaces (namespace, file, dim, rows) VALUES (?, ?, ?, 0)",
+                        (namespace, info[0], info[1]),
+                    )
+                file, dim, _ = info
+                if vectors.shape[1] != dim:
+                    # The provider changed its dimensions under the same model name, do not mix them
+                    return
+
+                # Rows appended by a writer that failed before committing are skipped, a partly
+                # written row is overwritten
+                path = os.path.join(self.path, file)
+                start = os.path.getsize(path) // (dim * 2) if os.path.exists(path) else 0
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.seek(start * dim * 2)
+                    f.write(vectors.tobytes())
+
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (namespace, hash, row, last_used) VALUES (?, ?, ?, ?)",
+                    [(namespace, h, start + i, now) for i, h in enumerate(hashes)],
+                )
+                self._db.execute("UPDATE namespaces SET rows = ? WHERE namespace = ?", (start + len(hashes), namespace))
+
+            if self.bytes_used > self.max_bytes:
+                self._evict()
+
+    @property
+    def bytes_used(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(dim * rows * 2), 0) FROM namespaces").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Drops the least recently used vectors until the cache is back under the target size"""
+        replaced_files = []
+        with self._transaction():
+            to_free = self.bytes_used - int(self.max_bytes * _EVICTION_TARGET)
+            if to_free <= 0:
+                # Another process evicted in the meantime
+                return
+            evicted = []
+            freed = 0
+            for namespace, h, dim in self._db.execute(
+                "SELECT e.namespace, e.hash, n.dim FROM entries e JOIN namespaces n USING (namespace) ORDER BY e.last_used"
+            ).fetchall():
+                if freed >= to_free:
+                    break
+                evicted.append((namespace, h))
+                freed += dim * 2
+
+            self._db.executemany("DELETE FROM entries WHERE namespace = ? AND hash = ?", evicted)
+            for (namespace,) in self._db.execute("SELECT namespace FROM namespaces").fetchall():
+                replaced_files.extend(self._compact(namespace))
+
+        # Readers of other processes find the new files in the index from now on
+        for file in replaced_files:
+            try:
+                os.remove(os.path.join(self.path, file))
+            except OSError:
+                pass
+
+    def _compact(self, namespace: str) -> List[str]:
+        """
+        Writes the rows of a namespace that are still referenced to a new file, within the caller's
+        transaction
+        Returns:
+            The replaced file, to delete once the transaction is committed
+        """
+        file, dim, rows = self._namespace(namespace)
+        entries = self._db.execute(
+            "SELECT hash, row FROM entries WHERE namespace = ? ORDER BY row", (namespace,)
+        ).fetchall()
+        if len(entries) == rows:
+            return []
+
+        mapped = self._map(namespace, file, dim, rows)
+        kept = np.asarray(mapped[[row for _, row in entries]]) if entries else np.empty((0, dim), dtype=np.float16)
+        self._maps.pop(namespace, None)
+        del mapped
+
+        fd, new_path = tempfile.mkstemp(dir=self.path, prefix=f"{text_hash(namespace)[:16]}.", suffix=".f16")
+        with os.fdopen(fd, "wb") as f:
+            f.write(kept.astype(np.float16).tobytes())
+
+        self._db.executemany(
+            "UPDATE entries SET row = ? WHERE namespace = ? AND hash = ?",
+            [(i, namespace, h) for i, (h, _) in enumerate(entries)],
+        )
+        self._db.execute(
+            "UPDATE namespaces SET file = ?, rows = ? WHERE namespace = ?",
+            (os.path.basename(new_path), len(entries), namespace),
+        )
+        return [file]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def cached_embed(
+    store: EmbeddingCacheStore,
+    namespace: str,
+    texts: List[str],
+    embed: Callable[[List[str]], List[List[float]]],
+) -> List[List[float]]:
+    """Embeds the texts, sending only the ones missing from the cache to `embed` in one batch"""
+    hashes = [text_hash(text) for text in texts]
+    vectors = {h: vector.tolist() for h, vector in store.get(namespace, hashes).items()}
+
+    missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+    billed_tokens = 0
+    if missing:
+        # Imported here, memory.embeddings imports this module
+        from .embeddings import OPENAI_EMBEDDING_MODEL
+
+        with measure_embedding_usage() as usage:
+            new_vectors = embed(list(missing.values()))
+        billed_tokens = usage.tokens if usage.tokens is not None else sum(
+            count_tokens(text, OPENAI_EMBEDDING_MODEL) for text in missing.values()
+        )
+        store.put(namespace, list(missing), np.asarray(new_vectors, dtype=np.float32))
+        vectors.update(zip(missing, new_vectors))
+    # Only the misses were sent to the provider
+    report_embedding_usage(billed_tokens)
+
+    return [vectors[h] for h in hashes]
+
+
+@lru_cache(maxsize=None)
+def _get_embedding_cache(path: str, max_bytes: int) -> EmbeddingCacheStore:
+    return EmbeddingCacheStore(path, max_bytes)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCacheStore]:
+    """
+    Returns the cache configured by the EMBEDDING_CACHE, EMBEDDING_CACHE_DIR and
+    EMBEDDING_CACHE_MAX_MB env vars, or None when caching is disabled
+    """
+    if os.getenv("EMBEDDING_CACHE", "false").lower() not in ("true", "1"):
+        return None
+    return _get_embedding_cache(
+        os.getenv("EMBEDDING_CACHE_DIR", "./embedding-cache"),
+        int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+    )
+
+
+def wrap_embedding_cache(embeddings, provider: str, model: str):
+    """Wraps an embeddings provider so its vectors are looked up in the persistent cache first"""
+    store = get_embedding_cache()
+    if store is None or embeddings is None:
+        return embeddings
+
+    from langchain_core.embeddings import Embeddings
+
+    namespace = f"{provider}:{model}"
+
+    class CachedEmbeddings(Embeddings):
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return cached_embed(store, namespace, texts, embeddings.embed_documents)
+
+        def embed_query(self, text: str) -> List[float]:
+            # Some providers embed queries differently from documents, they are cached apart
+            return cached_embed(
+                store, f"{namespace}:query", [text], lambda texts: [embeddings.embed_query(texts[0])]
+            )[0]
+
+    return CachedEmbeddings()
@@ -1,5 +1,9 @@
+import asyncio
 import os
-from typing import Any
+from typing import Any, List
+
+from ..utils.cassette import wrap_embeddings
+from .embedding_cache import wrap_embedding_cache
 
 OPENAI_EMBEDDING_MODEL = os.environ.get(
     "OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"
@@ -19,9 +23,18 @@ _SUPPORTED_PROVIDERS = {
     "nomic",
     "voyageai",
     "custom",
+    "local_hashing",
 }
 
 
+async def embed_queries(embeddings, queries: List[str]) -> List[List[float]]:
+    """
+    Embeds search queries concurrently with embed_query. Providers with input types (Cohere, Voyage,
+    Nomic, DashScope) embed queries differently from documents, embed_documents would not match.
+    """
+    return list(await asyncio.gather(*[asyncio.to_thread(embeddings.embed_query, query) for query in queries]))
+
+
 class Memory:
     def __init__(self, embedding_provider: str, model: str, **embdding_kwargs: Any):
         _embeddings = None
@@ -102,10 +115,14 @@ class Memory:
                     model=model,
                     **embdding_kwargs,
                 )
+            case "local_hashing":
+                from .hashing_embeddings import HashingEmbeddings
+
+                _embeddings = HashingEmbeddings.from_model_name(model, **embdding_kwargs)
             case _:
                 raise Exception("Embedding not found.")
 
-        self._embeddings = _embeddings
+        self._embeddings = wrap_embeddings(wrap_embedding_cache(_embeddings, embedding_provider, model))
 
     def get_embeddings(self):
         return self._embeddings
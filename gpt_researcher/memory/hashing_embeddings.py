@@ -0,0 +1,102 @@
+import math
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..context.bm25 import tokenize
+from .usage import report_embedding_usage
+
+# Texts are hashed in batches so the feature matrix of a batch stays small
+_BATCH_SIZE = 256
+_MAX_CACHED_TOKENS = 1_000_000
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embedding provider that runs fully offline, for benchmarks, CI and air-gapped deployments.
+    Tokens (words, or character bigrams for CJK text) are hashed into `n_features` signed buckets
+    with sublinear term frequencies, the hashing trick. When `dimensions` is set, the hashed vectors
+    are reduced with a seeded Gaussian random projection, which approximately preserves cosine
+    similarities. Vectors are deterministic across processes and machines.
+    """
+
+    def __init__(self, n_features: int = 1024, dimensions: Optional[int] = None, seed: int = 0):
+        self.n_features = n_features
+        self.dimensions = dimensions if dimensions and dimensions < n_features else None
+        self.seed = seed
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+        self._projection: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_model_name(cls, model: str, **kwargs) -> "HashingEmbeddings":
+        """
+        Parses models like "1024" (1024 hashed features) or "65536x256" (65536 hashed features
+        projected to 256 dimensions)
+        """
+        n_features, _, dimensions = (model or "").lower().partition("x")
+        return cls(
+            n_features=int(n_features) if n_features.isdigit() else 1024,
+            dimensions=int(dimensions) if dimensions.isdigit() else None,
+            **kwargs,
+        )
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            # crc32 is stable across processes, unlike hash() of str
+            h = zlib.crc32(token.encode("utf-8"))
+            bucket = (h % self.n_features, 1.0 if (h >> 31) & 1 else -1.0)
+            if len(self._buckets) >= _MAX_CACHED_TOKENS:
+                self._buckets.clear()
+            self._buckets[token] = bucket
+        return bucket
+
+    @property
+    def projection(self) -> np.ndarray:
+        if self._projection is None:
+            rng = np.random.default_rng(self.seed)
+            self._projection = rng.standard_normal((self.n_features, self.dimensions), dtype=np.float32)
+            self._projection /= math.sqrt(self.dimensions)
+        return self._projection
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        rows, buckets, weights = [], [], []
+        for row, text in enumerate(texts):
+            for token, frequency in Counter(tokenize(text)).items():
+                bucket, sign = self._bucket(token)
+                rows.append(row)
+                buckets.append(bucket)
+                weights.append(sign * (1.0 + math.log(frequency)))
+        rows = np.asarray(rows, dtype=np.int64)
+        buckets = np.asarray(buckets, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        if self.dimensions:
+            # Sum the projection rows of each text's features instead of multiplying a dense
+            # (texts x n_features) matrix, rows are already grouped by text
+            vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+            if len(rows):
+                starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+                vectors[rows[starts]] = np.add.reduceat(self.projection[buckets] * weights[:, None], starts)
+        else:
+            vectors = np.bincount(
+                rows * self.n_features + buckets, weights=weights, minlength=len(texts) * self.n_features
+            ).astype(np.float32).reshape(len(texts), self.n_features)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Nothing is billed for local embeddings
+        report_embedding_usage(0)
+        return np.concatenate(
+            [self._embed_batch(texts[i:i + _BATCH_SIZE]) for i in range(0, len(texts), _BATCH_SIZE)]
+            or [np.empty((0, self.dimensions or self.n_features), dtype=np.float32)]
+        ).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        report_embedding_usage(0)
+        return self._embed_batch([text])[0].tolist()
@@ -0,0 +1,76 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+
+from ..utils.costs import EMBEDDING_COST
+
+
+class EmbeddingUsage:
+    """Tokens reported by embedding providers during a measure_embedding_usage block"""
+
+    def __init__(self):
+        self.tokens: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens = (self.tokens or 0) + tokens
+
+
+_current_usage: ContextVar[Optional[EmbeddingUsage]] = ContextVar("embedding_usage", default=None)
+
+
+def report_embedding_usage(tokens: int) -> None:
+    """
+    Reports the tokens an embedding provider was actually billed for, e.g. only the cache misses
+    of a cached provider, or 0 for a local provider
+    """
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(tokens)
+
+
+@contextmanager
+def measure_embedding_usage() -> Iterator[EmbeddingUsage]:
+    """
+    Collects the usage reported by the embedding calls made inside the block, including calls made
+    through asyncio.to_thread. `tokens` stays None when the provider reported nothing.
+    """
+    usage = EmbeddingUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+class EmbeddingUsageMeter:
+    """Embedding tokens and cost of a research run."""
+
+    def __init__(self, cost_per_token: float = EMBEDDING_COST, cost_callback: Optional[Callable] = None):
+        self.cost_per_token = cost_per_token
+        self.cost_callback = cost_callback
+        self.tokens = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cost(self) -> float:
+        return self.tokens * self.cost_per_token
+
+    def record(self, usage: EmbeddingUsage, counted_tokens: int, texts: int = 1) -> None:
+        """
+        Records an embedding call, preferring the tokens reported by the provider over the tokens
+        counted locally
+        """
+        tokens = usage.tokens if usage.tokens is not None else counted_tokens
+        with self._lock:
+            self.tokens += tokens
+            self.texts += texts
+        if self.cost_callback:
+            self.cost_callback(tokens * self.cost_per_token)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"tokens": self.tokens, "texts": self.texts, "cost": self.cost}
@@ -64,7 +64,7 @@ def generate_report_prompt(
     """
 
     reference_prompt = ""
-    if report_source == ReportSource.Web.value:
+    if report_source in (ReportSource.Web.value, ReportSource.Fast.value):
         reference_prompt = f"""
 你必须在报告结尾处写出所有使用的来源网址作为参考，并确保不添加重复的来源，每个来源仅列出一次。
 每个网址都应该是超链接格式：[网址名称](网址)
@@ -154,7 +154,7 @@ def generate_resource_report_prompt(
     """
 
     reference_prompt = ""
-    if report_source == ReportSource.Web.value:
+    if report_source in (ReportSource.Web.value, ReportSource.Fast.value):
         reference_prompt = f"""
             你必须包含所有相关来源的网址。 每个网址应使用超链接格式：[网址名称](网址)。
             """
@@ -6,6 +6,8 @@ import requests
 import json
 import logging
 
+from ..key_pool import get_key_pool
+
 
 class BingSearch():
     """
@@ -20,11 +22,12 @@ class BingSearch():
         """
         self.query = query
         self.api_key = self.get_api_key()
+        self.key_pool = get_key_pool("bing", self.api_key)
         self.logger = logging.getLogger(__name__)
 
     def get_api_key(self):
         """
-        Gets the Bing API key
+        Gets the Bing API key, several comma separated keys are used as a key pool
         Returns:
 
         """
@@ -47,10 +50,6 @@ class BingSearch():
         # Search the query
         url = "https://api.bing.microsoft.com/v7.0/search"
 
-        headers = {
-            'Ocp-Apim-Subscription-Key': self.api_key,
-            'Content-Type': 'application/json'
-        }
         params = {
             "responseFilter": "Webpages",
             "q": self.query,
@@ -61,7 +60,12 @@ class BingSearch():
             "safeSearch": "Strict"
         }
 
-        resp = requests.get(url, headers=headers, params=params)
+        resp = self.key_pool.request(
+            lambda api_key: requests.get(url, params=params, headers={
+                'Ocp-Apim-Subscription-Key': api_key,
+                'Content-Type': 'application/json'
+            })
+        )
 
         # Preprocess the results
         if resp is None:
@@ -35,7 +35,9 @@ class CustomRetriever:
             [
               {
                 "url": "http://example.com/page1",
-                "raw_content": "Content of page 1"
+                "raw_content": "Content of page 1",
+                "title": "Page 1 (optional)",
+                "images": ["http://example.com/image1.png (optional)"]
               },
               {
                 "url": "http://example.com/page2",
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percentile / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class RetrieverHealth:
+    """
+    Rolling latency and outcome statistics of a single retriever.
+    Outcomes are one of "ok", "empty", "error" or "timeout".
+    """
+
+    def __init__(self, window: int = 50):
+        self.samples = deque(maxlen=window)
+        self.total_calls = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, latency: float, outcome: str, error: Optional[str] = None) -> None:
+        self.samples.append((latency, outcome))
+        self.total_calls += 1
+        if error:
+            self.last_error = error
+
+    def rate(self, *outcomes: str) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, outcome in self.samples if outcome in outcomes) / len(self.samples)
+
+    @property
+    def error_rate(self) -> float:
+        return self.rate("error", "timeout")
+
+    @property
+    def empty_rate(self) -> float:
+        return self.rate("empty")
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        latencies = sorted(latency for latency, _ in self.samples)
+        return {f"p{p}": round(_percentile(latencies, p), 3) for p in (50, 90, 99)}
+
+    def is_cooling_down(self, now: Optional[float] = None) -> bool:
+        return (now or time.monotonic()) < self.cooldown_until
+
+
+class RetrieverHealthRegistry:
+    """
+    Tracks the health of every retriever used in this process, so that slow or failing
+    search providers can be skipped for a cool-down period and healthy ones are tried first.
+    Most retrievers catch their own request errors and return no results, so a retriever that
+    keeps returning nothing is treated as failing too.
+    """
+
+    def __init__(
+        self,
+        window: int = 50,
+        min_samples: int = 3,
+        error_rate_threshold: float = 0.5,
+        empty_rate_threshold: float = 0.8,
+        cooldown: float = 60.0,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.empty_rate_threshold = empty_rate_threshold
+        self.cooldown = cooldown
+        self._health: Dict[str, RetrieverHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> RetrieverHealth:
+        if name not in self._health:
+            self._health[name] = RetrieverHealth(self.window)
+        return self._health[name]
+
+    def record(
+        self,
+        name: str,
+        latency: float,
+        outcome: str,
+        error: Optional[str] = None,
+        cooldown: Optional[float] = None,
+    ) -> None:
+        """
+        Records the outcome of a search call. A failing or empty call puts the retriever in
+        cool-down once its error rate, or its empty rate, over the rolling window reaches the threshold.
+        """
+        with self._lock:
+            health = self._get(name)
+            health.record(latency, outcome, error)
+            if len(health.samples) < self.min_samples:
+                return
+            failing = outcome in ("error", "timeout") and health.error_rate >= self.error_rate_threshold
+            # e.g. a bad key or a 500 that the retriever turned into an empty response
+            empty = outcome == "empty" and health.empty_rate >= self.empty_rate_threshold
+            if failing or empty:
+                health.cooldown_until = time.monotonic() + (cooldown if cooldown is not None else self.cooldown)
+
+    def is_available(self, name: str) -> bool:
+        with self._lock:
+            return name not in self._health or not self._health[name].is_cooling_down()
+
+    def select(self, retrievers: List[Any]) -> List[Any]:
+        """
+        Orders retriever classes from healthiest to least healthy and drops the ones that are
+        cooling down. If every retriever is cooling down, only the one whose cool-down ends
+        first is returned so research can still proceed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            def sort_key(retriever):
+                health = self._health.get(retriever.__name__)
+                if health is None or not health.samples:
+                    return (False, False, 0.0)
+                return (
+                    health.is_cooling_down(now),
+                    health.empty_rate >= self.empty_rate_threshold,
+                    health.latency_percentiles()["p50"],
+                )
+
+            ranked = sorted(retrievers, key=sort_key)
+            available = [r for r in ranked if not sort_key(r)[0]]
+            if not available and ranked:
+                available = [min(ranked, key=lambda r: self._health[r.__name__].cooldown_until)]
+        return available
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the current health state of every retriever, e.g. for a status endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "calls": health.total_calls,
+                    "window": len(health.samples),
+                    "latency": health.latency_percentiles(),
+                    "error_rate": round(health.error_rate, 3),
+                    "timeout_rate": round(health.rate("timeout"), 3),
+                    "empty_rate": round(health.empty_rate, 3),
+                    "cooling_down": health.is_cooling_down(now),
+                    "cooldown_remaining": round(max(0.0, health.cooldown_until - now), 1),
+                    "last_error": health.last_error,
+                }
+                for name, health in self._health.items()
+            }
+
+    def reset(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._health.clear()
+            else:
+                self._health.pop(name, None)
+
+
+# Process wide registry shared by all researchers
+retriever_health = RetrieverHealthRegistry()
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+
+# Monotonic time by which the current search must return, set by the caller running the retriever.
+# asyncio.to_thread copies it into the thread running the search, so waiting for a key never
+# outlasts the search timeout.
+search_deadline: ContextVar[Optional[float]] = ContextVar("search_deadline", default=None)
+
+
+class RateLimited(Exception):
+    """Raised when no key of a pool can serve a request before the deadline"""
+
+
+def mask_key(key: str) -> str:
+    """Masks an API key so it can be logged or exposed safely"""
+    return f"{key[:4]}...{key[-4:]}" if len(key) > 12 else "***"
+
+
+class _KeyState:
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.backoff_until = 0.0
+        self.strikes = 0
+        self.requests = 0
+        self.rate_limited = 0
+
+
+class ApiKeyPool:
+    """
+    A pool of API keys for one search provider.
+    Every key has its own token bucket so requests are spread across keys without exceeding
+    the per-key QPS, and a key that receives a 429 backs off on its own while the other keys
+    keep serving.
+    """
+
+    def __init__(self, name: str, keys: List[str], qps: float = 5.0, burst: Optional[float] = None,
+                 max_backoff: float = 60.0):
+        if not keys:
+            raise ValueError(f"No API keys provided for {name}")
+        self.name = name
+        self.keys = keys
+        self.qps = qps
+        self.capacity = burst or max(1.0, qps)
+        self.max_backoff = max_backoff
+        self._state: Dict[str, _KeyState] = {key: _KeyState(self.capacity) for key in keys}
+        self._lock = threading.Lock()
+
+    def _refill(self, state: _KeyState, now: float) -> None:
+        state.tokens = min(self.capacity, state.tokens + (now - state.updated_at) * self.qps)
+        state.updated_at = now
+
+    def _wait_time(self, state: _KeyState, now: float) -> float:
+        return max(state.backoff_until - now, (1 - state.tokens) / self.qps if state.tokens < 1 else 0.0, 0.0)
+
+    def _deadline(self, timeout: float) -> float:
+        deadline = time.monotonic() + timeout
+        caller_deadline = search_deadline.get()
+        return min(deadline, caller_deadline) if caller_deadline is not None else deadline
+
+    def acquire(self, timeout: float = 30.0, deadline: Optional[float] = None) -> str:
+        """
+        Takes a token from the least loaded key that is not backing off, waiting for one to
+        become available if needed, but not past the deadline of the search.
+        Raises:
+            RateLimited: If no key becomes available in time
+        """
+        deadline = deadline if deadline is not None else self._deadline(timeout)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for state in self._state.values():
+                    self._refill(state, now)
+                available = [
+                    key for key, state in self._state.items()
+                    if state.backoff_until <= now and state.tokens >= 1
+                ]
+                if available:
+                    key = max(available, key=lambda k: (self._state[k].tokens, -self._state[k].requests))
+                    self._state[key].tokens -= 1
+                    self._state[key].requests += 1
+                    return key
+                wait = min(self._wait_time(state, now) for state in self._state.values())
+
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(f"All {len(self.keys)} {self.name} API keys are rate limited.")
+            time.sleep(max(wait, 0.01))
+
+    def report_rate_limited(self, key: str, retry_after: Optional[str] = None) -> None:
+        """Backs off a key that received a 429, honoring the Retry-After header when present"""
+        with self._lock:
+            state = self._state[key]
+            state.strikes += 1
+            state.rate_limited += 1
+            try:
+                backoff = float(retry_after)
+            except (TypeError, ValueError):
+                backoff = min(self.max_backoff, 2 ** state.strikes)
+            state.backoff_until = time.monotonic() + backoff
+            state.tokens = 0
+
+    def report_success(self, key: str) -> None:
+        with self._lock:
+            self._state[key].strikes = 0
+
+    def request(self, send: Callable[[str], requests.Response]) -> requests.Response:
+        """
+        Sends a request with a key from the pool, retrying with another key on a 429.
+        Args:
+            send: Function sending the request with the given API key
+        Returns:
+            The response received
+        Raises:
+            RateLimited: If every attempt was rate limited or no key became available in time
+        """
+        deadline = self._deadline(30.0)
+        for _ in range(len(self.keys) + 1):
+            key = self.acquire(deadline=deadline)
+            response = send(key)
+            if response is not None and response.status_code == 429:
+                self.report_rate_limited(key, response.headers.get("Retry-After"))
+                continue
+            self.report_success(key)
+            return response
+        raise RateLimited(f"Every {self.name} request was rate limited.")
+
+    def usage(self) -> Dict[str, Dict[str, float]]:
+        """Per-key usage counters for capacity planning"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                mask_key(key): {
+                    "requests": state.requests,
+                    "rate_limited": state.rate_limited,
+                    "backoff_remaining": round(max(0.0, state.backoff_until - now), 1),
+                }
+                for key, state in self._state.items()
+            }
+
+
+_pools: Dict[tuple, ApiKeyPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_key_pool(name: str, api_keys: str) -> ApiKeyPool:
+    """
+    Returns the process wide key pool of a provider. `api_keys` may hold several comma
+    separated keys. The per-key rate can be set with the <NAME>_KEY_QPS env var.
+    """
+    keys = [key.strip() for key in api_keys.split(",") if key.strip()]
+    with _pools_lock:
+        pool_id = (name, tuple(keys))
+        if pool_id not in _pools:
+            qps = float(os.getenv(f"{name.upper()}_KEY_QPS", 5))
+            _pools[pool_id] = ApiKeyPool(name, keys, qps=qps)
+        return _pools[pool_id]
+
+
+def get_key_pools_usage() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Returns the usage counters of every key of every provider"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    usage: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for pool in pools:
+        usage.setdefault(pool.name, {}).update(pool.usage())
+    return usage
@@ -5,6 +5,8 @@ import os
 import requests
 import urllib.parse
 
+from ..key_pool import RateLimited, get_key_pool
+
 
 class SerpApiSearch():
     """
@@ -18,10 +20,11 @@ class SerpApiSearch():
         """
         self.query = query
         self.api_key = self.get_api_key()
+        self.key_pool = get_key_pool("serpapi", self.api_key)
 
     def get_api_key(self):
         """
-        Gets the SerpApi API key
+        Gets the SerpApi API key, several comma separated keys are used as a key pool
         Returns:
 
         """
@@ -43,14 +46,13 @@ class SerpApiSearch():
 
 
         url = "https://serpapi.com/search.json"
-        params = {
-            "q": self.query,
-            "api_key": self.api_key
-        }
-        encoded_url = url + "?" + urllib.parse.urlencode(params)
         search_response = []
         try:
-            response = requests.get(encoded_url, timeout=10)
+            response = self.key_pool.request(
+                lambda api_key: requests.get(
+                    url + "?" + urllib.parse.urlencode({"q": self.query, "api_key": api_key}), timeout=10
+                )
+            )
             if response.status_code == 200:
                 search_results = response.json()
                 if search_results:
@@ -69,6 +71,9 @@ class SerpApiSearch():
                         }
                         search_response.append(search_result)
                         results_processed += 1
+        except RateLimited:
+            # Reported to the retriever health registry by the caller
+            raise
         except Exception as e:
             print(f"Error: {e}. Failed fetching sources. Resulting in empty response.")
             search_response = []
@@ -5,6 +5,8 @@ import os
 import requests
 import json
 
+from ..key_pool import get_key_pool
+
 
 class SerperSearch():
     """
@@ -18,10 +20,11 @@ class SerperSearch():
         """
         self.query = query
         self.api_key = self.get_api_key()
+        self.key_pool = get_key_pool("serper", self.api_key)
 
     def get_api_key(self):
         """
-        Gets the Serper API key
+        Gets the Serper API key, several comma separated keys are used as a key pool
         Returns:
 
         """
@@ -45,13 +48,14 @@ class SerperSearch():
         # Search the query (see https://serper.dev/playground for the format)
         url = "https://google.serper.dev/search"
 
-        headers = {
-        'X-API-KEY': self.api_key,
-        'Content-Type': 'application/json'
-        }
         data = json.dumps({"q": self.query, "num": max_results})
 
-        resp = requests.request("POST", url, timeout=10, headers=headers, data=data)
+        resp = self.key_pool.request(
+            lambda api_key: requests.request("POST", url, timeout=10, data=data, headers={
+                'X-API-KEY': api_key,
+                'Content-Type': 'application/json'
+            })
+        )
 
         # Preprocess the results
         if resp is None:
@@ -6,6 +6,8 @@ from typing import Literal, Sequence, Optional
 import requests
 import json
 
+from ..key_pool import RateLimited, get_key_pool
+
 
 class TavilySearch():
     """
@@ -23,13 +25,15 @@ class TavilySearch():
         self.topic = topic
         self.base_url = "https://api.tavily.com/search"
         self.api_key = self.get_api_key()
+        self.key_pool = get_key_pool("tavily", self.api_key)
+        self.include_raw_content = os.getenv("TAVILY_INCLUDE_RAW_CONTENT", "false").lower() in ("true", "1", "yes", "on")
         self.headers = {
             "Content-Type": "application/json",
         }
 
     def get_api_key(self):
         """
-        Gets the Tavily API key
+        Gets the Tavily API key, several comma separated keys are used as a key pool
         Returns:
 
         """
@@ -70,12 +74,13 @@ class TavilySearch():
             "include_domains": include_domains,
             "exclude_domains": exclude_domains,
             "include_images": include_images,
-            "api_key": self.api_key,
             "use_cache": use_cache,
         }
 
-        response = requests.post(self.base_url, data=json.dumps(
-            data), headers=self.headers, timeout=100)
+        response = self.key_pool.request(
+            lambda api_key: requests.post(self.base_url, data=json.dumps(
+                {**data, "api_key": api_key}), headers=self.headers, timeout=100)
+        )
 
         if response.status_code == 200:
             return response.json()
@@ -92,13 +97,19 @@ class TavilySearch():
         try:
             # Search the query
             results = self._search(
-                self.query, search_depth="basic", max_results=max_results, topic=self.topic)
+                self.query, search_depth="basic", max_results=max_results, topic=self.topic,
+                include_raw_content=self.include_raw_content)
             sources = results.get("results", [])
             if not sources:
                 raise Exception("No results found with Tavily API search.")
             # Return the results
             search_response = [{"href": obj["url"],
-                                "body": obj["content"]} for obj in sources]
+                                "title": obj.get("title", ""),
+                                "body": obj["content"],
+                                "raw_content": obj.get("raw_content")} for obj in sources]
+        except RateLimited:
+            # Reported to the retriever health registry by the caller
+            raise
         except Exception as e:
             print(
                 f"Error: {e}. Failed fetching sources. Resulting in empty response.")
@@ -3,6 +3,7 @@ from functools import partial
 
 import requests
 
+from ..utils.cassette import get_cassette
 from . import (
     ArxivScraper,
     BeautifulSoupScraper,
@@ -39,6 +40,14 @@ class Scraper:
         return res
 
     def extract_data_from_url(self, link, session):
+        """
+        Extracts the data from the link, through the record/replay cassette if one is enabled
+        """
+        return get_cassette().call(
+            "scrape", (link, self.scraper), partial(self._extract_data_from_url, link, session)
+        )
+
+    def _extract_data_from_url(self, link, session):
         """
         Extracts the data from the link
         """
@@ -58,6 +58,31 @@ class BrowserManager:
 
         return scraped_content
 
+    async def add_retrieved_content(self, sources: List[Dict]) -> List[Dict]:
+        """
+        Register sources whose content was already returned by a retriever, so they need no scraping.
+
+        Args:
+            sources (List[Dict]): Source records with url, title, raw_content and optional image_urls.
+
+        Returns:
+            List[Dict]: The same source records, in the format returned by browse_urls.
+        """
+        images = [img for source in sources for img in source.get("image_urls", [])]
+        self.researcher.add_research_sources(sources)
+        new_images = self.select_top_images(images, k=4)
+        self.researcher.add_research_images(new_images)
+
+        if self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "retrieved_content",
+                f"📄 检索器直接返回了 {len(sources)} 篇内容，无需抓取",
+                self.researcher.websocket,
+            )
+
+        return sources
+
     def select_top_images(self, images: List[Dict], k: int = 2) -> List[str]:
         """
         Select most relevant images and remove duplicates based on image content.
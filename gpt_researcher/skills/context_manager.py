@@ -1,15 +1,116 @@
 import asyncio
 from typing import List, Dict, Optional, Set
 
+from ..context.chunk_store import ChunkStore
 from ..context.compression import ContextCompressor, WrittenContentCompressor, VectorstoreCompressor
+from ..context.local_index import load_local_chunk_store, save_local_chunk_store
+from ..context.packing import assign_chunks, format_chunk
+from ..context.section_index import WrittenSectionIndex
 from ..actions.utils import stream_output
 
+# Chunks in the context of each sub-query
+MAX_RESULTS = 10
+# Each sub-query keeps more candidates than it renders, to replace the chunks assigned to another sub-query
+CANDIDATES_FACTOR = 2
+
 
 class ContextManager:
     """Manages context for the researcher agent."""
 
     def __init__(self, researcher):
         self.researcher = researcher
+        self._chunk_store: Optional[ChunkStore] = None
+        # Every chunk is rendered into the context of one sub-query only
+        self.rendered_chunk_ids: Set[str] = set()
+        # Candidate research chunks of the sub-queries searched since the last assignment
+        self._candidates: Dict[str, List[Dict]] = {}
+        # Size of the local documents chunk store when it was last loaded or saved
+        self._local_index_state: Optional[tuple] = None
+
+    def _chunk_store_kwargs(self) -> Dict:
+        return {
+            "retrieval_mode": self.researcher.cfg.retrieval_mode,
+            "bm25_candidates": self.researcher.cfg.bm25_candidates,
+            "vector_weight": self.researcher.cfg.hybrid_vector_weight,
+            "usage_meter": self.researcher.embedding_usage,
+        }
+
+    @property
+    def chunk_store(self) -> ChunkStore:
+        """Chunks embedded during this research run, shared by all sub-queries"""
+        if self._chunk_store is None:
+            self._chunk_store = ChunkStore(self.researcher.memory.get_embeddings(), **self._chunk_store_kwargs())
+        return self._chunk_store
+
+    def _embedding_name(self) -> str:
+        return f"{self.researcher.cfg.embedding_provider}:{self.researcher.cfg.embedding_model}"
+
+    def _local_store_state(self) -> tuple:
+        store = self._chunk_store
+        return len(store), len(store._embedded), len(store.ann) if store.ann is not None else 0
+
+    async def load_local_index(self, documents: List[Dict]) -> None:
+        """
+        Uses the chunk store saved for DOC_PATH by a previous research as the chunk store of this
+        run, updated with the given documents, and indexes it for approximate nearest-neighbour
+        search once it holds ANN_MIN_CHUNKS chunks.
+        """
+        cfg = self.researcher.cfg
+        if not cfg.local_index:
+            return
+
+        store = await asyncio.to_thread(
+            load_local_chunk_store,
+            cfg.doc_path,
+            cfg.local_index_dir,
+            self.researcher.memory.get_embeddings(),
+            self._embedding_name(),
+            **self._chunk_store_kwargs(),
+        )
+        if store is not None and self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "local_index_loaded",
+                f"🗃️ 已加载本地文档索引: {len(store)} 个文档片段",
+                self.researcher.websocket,
+            )
+        self._chunk_store = store or ChunkStore(self.researcher.memory.get_embeddings(), **self._chunk_store_kwargs())
+        self._local_index_state = self._local_store_state() if store is not None else ()
+
+        page_keys = set(await asyncio.to_thread(self._chunk_store.add_pages, documents))
+        self._chunk_store.retain_pages(page_keys)
+
+        if cfg.retrieval_mode == "embedding" and len(self._chunk_store) >= cfg.ann_min_chunks:
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "building_ann_index",
+                    f"🧭 正在为 {len(self._chunk_store)} 个本地文档片段构建近似最近邻索引...",
+                    self.researcher.websocket,
+                )
+            await self._chunk_store.update_ann_index(n_lists=cfg.ann_n_lists or None, n_probe=cfg.ann_n_probe)
+        await self.save_local_index()
+
+    async def save_local_index(self) -> None:
+        """Saves the local documents chunk store in LOCAL_INDEX_DIR when it changed since it was loaded or saved"""
+        if self._local_index_state is None or self._local_store_state() == self._local_index_state:
+            return
+        try:
+            await asyncio.to_thread(
+                save_local_chunk_store,
+                self._chunk_store,
+                self.researcher.cfg.doc_path,
+                self.researcher.cfg.local_index_dir,
+                self._embedding_name(),
+            )
+        except OSError as e:
+            await stream_output(
+                "logs",
+                "local_index_error",
+                f"⚠️ 无法保存本地文档索引: {e}",
+                self.researcher.websocket,
+            )
+        self._local_index_state = self._local_store_state()
 
     async def get_similar_content_by_query(self, query, pages):
         if self.researcher.verbose:
@@ -21,38 +122,75 @@ class ContextManager:
             )
 
         context_compressor = ContextCompressor(
-            documents=pages, embeddings=self.researcher.memory.get_embeddings()
+            documents=pages,
+            embeddings=self.researcher.memory.get_embeddings(),
+            chunk_store=self.chunk_store,
+            similarity_threshold=self.researcher.cfg.similarity_threshold,
+            similarity_percentile=self.researcher.cfg.similarity_percentile,
+            mmr_lambda=self.researcher.cfg.mmr_lambda,
+            exclude_chunk_ids=self.rendered_chunk_ids,
         )
-        return await context_compressor.async_get_context(
-            query=query, max_results=10, cost_callback=self.researcher.add_costs
+        await context_compressor.async_get_context(
+            query=query,
+            max_results=MAX_RESULTS * CANDIDATES_FACTOR,
+            cost_callback=self.researcher.add_costs,
+            chunk_callback=lambda chunks: self._candidates.setdefault(query, []).extend(chunks),
         )
+        return "\n".join(format_chunk(chunk) for chunk in self.query_chunks(query))
+
+    def query_chunks(self, query: str) -> List[Dict]:
+        """Best candidate chunks of a sub-query, before they are assigned"""
+        return self._candidates.get(query, [])[:MAX_RESULTS]
+
+    def assign_research_chunks(self, queries: List[str]) -> List[str]:
+        """
+        Assigns the candidate chunks of the given sub-queries, once all of them are searched, each to
+        the sub-query it is most relevant to, and adds them to the research chunks. Candidates of
+        other sub-queries, e.g. cancelled ones, are dropped.
+        Returns:
+            The context of each sub-query
+        """
+        candidates = {query: self._candidates.get(query, []) for query in queries}
+        self._candidates = {}
+        assigned = assign_chunks(candidates, MAX_RESULTS, self.rendered_chunk_ids)
+        for chunks in assigned.values():
+            self.rendered_chunk_ids.update(chunk["chunk_id"] for chunk in chunks)
+            self.researcher.add_research_chunks(chunks)
+        return ["\n".join(format_chunk(chunk) for chunk in assigned[query]) for query in queries]
         
-    async def get_similar_content_by_query_with_vectorstore(self, query, filter): 
+    async def get_similar_content_by_queries_with_vectorstore(self, queries: List[str], filter) -> List[str]:
+        """Context of each query from the vector store, searched in one batch without repeating documents"""
         if self.researcher.verbose:
             await stream_output(
                 "logs",
                 "fetching_query_format",
-                f" 为以下查询查找相关内容: {query}...",
+                f" 为以下查询查找相关内容: {queries}...",
                 self.researcher.websocket,
                 )
-        vectorstore_compressor = VectorstoreCompressor(self.researcher.vector_store, filter)
-        return await vectorstore_compressor.async_get_context(query=query, max_results=8)
+        vectorstore_compressor = VectorstoreCompressor(self.researcher.vector_store, filter=filter)
+        return await vectorstore_compressor.async_get_contexts(queries, max_results=8)
     
     async def get_similar_written_contents_by_draft_section_titles(
         self,
         current_subtopic: str,
         draft_section_titles: List[str],
         written_contents: List[Dict],
-        max_results: int = 10
+        max_results: int = 10,
+        section_index: Optional[WrittenSectionIndex] = None,
     ) -> List[str]:
         all_queries = [current_subtopic] + draft_section_titles
 
-        async def process_query(query: str) -> Set[str]:
-            return set(await self.__get_similar_written_contents_by_query(query, written_contents))
+        if section_index is not None:
+            relevant_contents = await self.__get_similar_written_contents_from_index(
+                all_queries, section_index, max_results=max_results
+            )
+        else:
+            async def process_query(query: str) -> Set[str]:
+                return set(await self.__get_similar_written_contents_by_query(query, written_contents))
 
-        results = await asyncio.gather(*[process_query(query) for query in all_queries])
-        relevant_contents = set().union(*results)
-        relevant_contents = list(relevant_contents)[:max_results]
+            results = await asyncio.gather(*[process_query(query) for query in all_queries])
+            relevant_contents = set().union(*results)
+            relevant_contents = list(relevant_contents)[:max_results]
 
         if relevant_contents and self.researcher.verbose:
             prettier_contents = "\n".join(relevant_contents)
@@ -62,6 +200,31 @@ class ContextManager:
 
         return relevant_contents
 
+    async def __get_similar_written_contents_from_index(
+        self,
+        queries: List[str],
+        section_index: WrittenSectionIndex,
+        similarity_threshold: float = 0.5,
+        max_results: int = 10,
+    ) -> List[str]:
+        """Looks all queries up in the written section index, each query embedded once"""
+        if self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "fetching_relevant_written_content",
+                f"🔎 Getting relevant written content based on {len(queries)} queries: {queries}...",
+                self.researcher.websocket,
+            )
+
+        results = await section_index.search(queries, similarity_threshold, max_results)
+        # A chunk relevant to several queries is used once, under its best similarity
+        best_scores: Dict[str, float] = {}
+        for query_results in results:
+            for chunk, score in query_results:
+                content = f"Title: {chunk.metadata.get('section_title')}\nContent: {chunk.page_content}\n"
+                best_scores[content] = max(score, best_scores.get(content, score))
+        return sorted(best_scores, key=lambda content: -best_scores[content])[:max_results]
+
     async def __get_similar_written_contents_by_query(self,
                                                       query: str,
                                                       written_contents: List[Dict],
@@ -79,7 +242,8 @@ class ContextManager:
         written_content_compressor = WrittenContentCompressor(
             documents=written_contents,
             embeddings=self.researcher.memory.get_embeddings(),
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            usage_meter=self.researcher.embedding_usage,
         )
         return await written_content_compressor.async_get_context(
             query=query, max_results=max_results, cost_callback=self.researcher.add_costs
@@ -1,11 +1,23 @@
 import asyncio
 import random
 import json
+import time
+from collections import deque
 from typing import Dict, Optional
 
 from ..actions.utils import stream_output
-from ..actions.query_processing import plan_research_outline, get_search_results
+from ..actions.query_processing import (
+    plan_research_outline,
+    deduplicate_sub_queries,
+    stream_sub_queries,
+    SubQueryDeduplicator,
+)
+from ..context.information_gain import InformationGainTracker
 from ..document import DocumentLoader, LangChainDocumentLoader
+from ..retrievers.health import retriever_health
+from ..retrievers.key_pool import search_deadline
+from ..utils.cassette import CassetteMiss, get_cassette
+from ..utils.costs import count_tokens
 from ..utils.enum import ReportSource, ReportType, Tone
 
 
@@ -14,16 +26,16 @@ class ResearchConductor:
 
     def __init__(self, researcher):
         self.researcher = researcher
+        self._speculative_scrape: Optional[asyncio.Task] = None
+        self._speculative_urls: list = []
 
-    async def plan_research(self, query): #搜索网络
-        await stream_output(
-            "logs",
-            "planning_research",
-            f"🌐 为以下问题进行网络搜索: {query}...",
-            self.researcher.websocket,
-        )
-
-        search_results = await get_search_results(query, self.researcher.retrievers[0])
+    async def plan_research(self, query, speculative_scrape: bool = False): #搜索网络
+        """
+        Searches the query and generates the sub-queries to research.
+        If speculative_scrape is set, the top initial search results are scraped in the background
+        while the strategic LLM plans, see _take_speculative_scrape.
+        """
+        search_results = await self._initial_search(query, speculative_scrape)
 
         await stream_output(
             "logs",
@@ -42,12 +54,33 @@ class ResearchConductor:
             cost_callback=self.researcher.add_costs,
         )
 
+    async def _initial_search(self, query, speculative_scrape: bool = False):
+        """Searches the query with the healthiest retriever to give the planner real time context"""
+        await stream_output(
+            "logs",
+            "planning_research",
+            f"🌐 为以下问题进行网络搜索: {query}...",
+            self.researcher.websocket,
+        )
+
+        search_results = await self._search_with_retriever(retriever_health.select(self.researcher.retrievers)[0], query)
+
+        if speculative_scrape and search_results:
+            self._speculative_urls = []
+            self._speculative_scrape = asyncio.create_task(
+                self._scrape_initial_search_results(search_results, self._speculative_urls)
+            )
+
+        return search_results
+
     async def conduct_research(self):
         """
         Runs the GPT Researcher to conduct research
         """
-        # Reset visited_urls and source_urls at the start of each research task
+        # Reset visited_urls, source_urls and research chunks at the start of each research task
         self.researcher.visited_urls.clear()
+        self.researcher.research_chunks = []
+        self.researcher.context_manager.rendered_chunk_ids = set(self.researcher.excluded_chunk_ids)
         research_data = []
 
         if self.researcher.verbose:
@@ -81,17 +114,22 @@ class ResearchConductor:
         elif self.researcher.report_source == ReportSource.Local.value:
             document_data = await DocumentLoader(self.researcher.cfg.doc_path).load()
             if self.researcher.vector_store:
-                self.researcher.vector_store.load(document_data)
+                await self.researcher.vector_store.aload(document_data)
 
+            await self.researcher.context_manager.load_local_index(document_data)
             research_data = await self._get_context_by_web_search(self.researcher.query, document_data)
+            # Chunks embedded during the research are saved for the next one
+            await self.researcher.context_manager.save_local_index()
 
         # Hybrid search including both local documents and web sources
         elif self.researcher.report_source == ReportSource.Hybrid.value:
             document_data = await DocumentLoader(self.researcher.cfg.doc_path).load()
             if self.researcher.vector_store:
-                self.researcher.vector_store.load(document_data)
+                await self.researcher.vector_store.aload(document_data)
             docs_context = await self._get_context_by_web_search(self.researcher.query, document_data)
+            self._set_research_chunks_origin("local")
             web_context = await self._get_context_by_web_search(self.researcher.query)
+            self._set_research_chunks_origin("web")
             research_data = f"来自本地文档中的内容: {docs_context}\n\n来自网页的内容: {web_context}"
 
         elif self.researcher.report_source == ReportSource.LangChainDocuments.value:
@@ -99,17 +137,25 @@ class ResearchConductor:
                 self.researcher.documents
             ).load()
             if self.researcher.vector_store:
-                self.researcher.vector_store.load(langchain_documents_data)
+                await self.researcher.vector_store.aload(langchain_documents_data)
             research_data = await self._get_context_by_web_search(
                 self.researcher.query, langchain_documents_data
             )
 
+        # Snippet-only research that skips scraping for low latency answers
+        elif self.researcher.report_source == ReportSource.Fast.value:
+            research_data = await self._get_context_by_search_snippets(self.researcher.query)
+
         elif self.researcher.report_source == ReportSource.LangChainVectorStore.value:
             research_data = await self._get_context_by_vectorstore(self.researcher.query, self.researcher.vector_store_filter)
         # Default web based research
         elif self.researcher.report_source == ReportSource.Web.value:
             research_data = await self._get_context_by_web_search(self.researcher.query)
 
+        # Documents still queued for the user's vector store are loaded before the research ends
+        if self.researcher.vector_store:
+            await self.researcher.vector_store.flush()
+
         # Rank and curate the sources based on the research data
         self.researcher.context = research_data
         if self.researcher.cfg.curate_sources:
@@ -125,6 +171,11 @@ class ResearchConductor:
 
         return self.researcher.context
 
+    def _set_research_chunks_origin(self, origin: str):
+        """Labels the research chunks gathered since the last call with their origin, "local" or "web"."""
+        for chunk in self.researcher.research_chunks:
+            chunk.setdefault("origin", origin)
+
     async def _get_context_by_urls(self, urls):
         """
         Scrapes and compresses the context from the given urls
@@ -141,9 +192,50 @@ class ResearchConductor:
         scraped_content = await self.researcher.scraper_manager.browse_urls(new_search_urls)
 
         if self.researcher.vector_store:
-            self.researcher.vector_store.load(scraped_content)
+            await self.researcher.vector_store.aload(scraped_content)
 
-        return await self.researcher.context_manager.get_similar_content_by_query(self.researcher.query, scraped_content)
+        await self.researcher.context_manager.get_similar_content_by_query(self.researcher.query, scraped_content)
+        return self.researcher.context_manager.assign_research_chunks([self.researcher.query])[0]
+
+    async def _get_context_by_search_snippets(self, query):
+        """
+        Generates the context for the research task straight from the snippets returned by the retrievers,
+        without planning sub-queries or scraping the result pages
+        Returns:
+            context: List of context
+        """
+        search_results = await self._search_relevant_sources(query)
+        pages = [
+            {
+                "url": result.get("href"),
+                "title": result.get("title", ""),
+                "raw_content": result.get("body") or result.get("raw_content"),
+            }
+            for result in search_results
+            if result.get("body") or result.get("raw_content")
+        ]
+        self.researcher.add_research_sources(pages)
+
+        if self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "search_snippets",
+                f"⚡ 使用 {len(pages)} 条搜索摘要生成上下文，跳过网页抓取...",
+                self.researcher.websocket,
+            )
+
+        if not pages:
+            return []
+
+        if self.researcher.cfg.fast_mode_compression:
+            await self.researcher.context_manager.get_similar_content_by_query(query, pages)
+            content = self.researcher.context_manager.assign_research_chunks([query])[0]
+        else:
+            content = "\n".join(
+                f"Source: {page['url']}\nTitle: {page['title']}\nContent: {page['raw_content']}\n"
+                for page in pages
+            )
+        return [content]
 
     async def _get_context_by_vectorstore(self, query, filter: Optional[dict] = None):
         """
@@ -157,6 +249,7 @@ class ResearchConductor:
         # If this is not part of a sub researcher, add original query to research for better results
         if self.researcher.report_type != "subtopic_report":
             sub_queries.append(query)
+        sub_queries = await self._deduplicate_sub_queries(query, sub_queries)
 
         if self.researcher.verbose:
             await stream_output(
@@ -168,52 +261,291 @@ class ResearchConductor:
                 sub_queries,
             )
 
-        # Using asyncio.gather to process the sub_queries asynchronously
-        context = await asyncio.gather(
-            *[
-                self._process_sub_query_with_vectorstore(sub_query, filter)
-                for sub_query in sub_queries
-            ]
+        # All sub-queries are embedded and searched in one batch
+        context = await self.researcher.context_manager.get_similar_content_by_queries_with_vectorstore(
+            sub_queries, filter
         )
+        for sub_query, content in zip(sub_queries, context):
+            await self._log_sub_query_vectorstore_context(sub_query, content)
         return context
 
+    async def _deduplicate_sub_queries(self, query, sub_queries):
+        """Merges paraphrased sub-queries so each one costs a single search, scrape and compression pass"""
+        sub_queries = list(dict.fromkeys(str(sub_query) for sub_query in sub_queries))
+        deduplicated = await deduplicate_sub_queries(
+            sub_queries,
+            self.researcher.memory.get_embeddings(),
+            self.researcher.cfg.sub_query_similarity_threshold,
+            keep=[query],
+            lexical=self.researcher.cfg.retrieval_mode == "bm25",
+        )
+        if len(deduplicated) < len(sub_queries) and self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "subqueries_deduplicated",
+                f"♻️ 合并了 {len(sub_queries) - len(deduplicated)} 个重复的子问题",
+                self.researcher.websocket,
+            )
+        return deduplicated
+
     async def _get_context_by_web_search(self, query, scraped_data: list = []):
         """
         Generates the context for the research task by searching the query and scraping the results
         Returns:
             context: List of context
         """
-        # Generate Sub-Queries including original query
-        sub_queries = await self.plan_research(query)
-        # If this is not part of a sub researcher, add original query to research for better results
-        if self.researcher.report_type != "subtopic_report":
-            sub_queries.append(query)
+        if self.researcher.cfg.stream_sub_queries:
+            return await self._get_context_by_streamed_sub_queries(query, scraped_data)
+
+        # The original query is researched anyway, so its initial search hits can be scraped while planning
+        research_original_query = self.researcher.report_type != "subtopic_report"
+        speculative_scrape = research_original_query and not scraped_data
+
+        try:
+            # Generate Sub-Queries including original query
+            sub_queries = await self.plan_research(query, speculative_scrape=speculative_scrape)
+            # If this is not part of a sub researcher, add original query to research for better results
+            if research_original_query:
+                sub_queries.append(query)
+            sub_queries = await self._deduplicate_sub_queries(query, sub_queries)
+
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "subqueries",
+                    f"🗂️ 我将基于下面的子问题开展研究: {sub_queries}...",
+                    self.researcher.websocket,
+                    True,
+                    sub_queries,
+                )
 
-        if self.researcher.verbose:
+            speculative_content = self._take_speculative_scrape() if query in sub_queries else None
+
+            if self.researcher.cfg.adaptive_research:
+                return await self._research_sub_queries_adaptively(
+                    query, sub_queries, scraped_data, speculative_content
+                )
+
+            # Using asyncio.gather to process the sub_queries asynchronously
+            context = await asyncio.gather(
+                *[
+                    self._process_sub_query(sub_query, scraped_data, speculative_content)
+                    if sub_query == query
+                    else self._process_sub_query(sub_query, scraped_data)
+                    for sub_query in sub_queries
+                ]
+            )
+            # Chunks found by several sub-queries go to the one they are most relevant to
+            context = self.researcher.context_manager.assign_research_chunks(sub_queries)
+        finally:
+            await self._cancel_speculative_scrape()
+
+        return context
+
+    async def _research_sub_queries_adaptively(
+        self, query, sub_queries: list, scraped_data: list = [], speculative_content: Optional[asyncio.Task] = None
+    ):
+        """
+        Researches the sub-queries with bounded concurrency and stops early once the marginal
+        information gain of the completed ones drops below RESEARCH_MIN_INFORMATION_GAIN or the
+        gathered context reaches RESEARCH_TOKEN_BUDGET. Remaining sub-queries are not launched and
+        running ones are cancelled.
+        Returns:
+            context: List of context of the completed sub-queries, in sub-query order
+        """
+        cfg = self.researcher.cfg
+        tracker = InformationGainTracker(self.researcher.context_manager.chunk_store)
+        # The original query is the broadest one and its initial results may already be scraped, it goes first
+        pending = deque(sorted(range(len(sub_queries)), key=lambda i: sub_queries[i] != query))
+        running: Dict[asyncio.Task, int] = {}
+        contexts: list = [None] * len(sub_queries)
+        completed = 0
+        total_tokens = 0
+        stop_reason = None
+
+        def launch_next():
+            while pending and len(running) < max(1, cfg.research_concurrency):
+                i = pending.popleft()
+                if sub_queries[i] == query:
+                    task = self._process_sub_query(sub_queries[i], scraped_data, speculative_content)
+                else:
+                    task = self._process_sub_query(sub_queries[i], scraped_data)
+                running[asyncio.create_task(task)] = i
+
+        try:
+            launch_next()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = running.pop(task)
+                    contexts[i] = task.result()
+                    completed += 1
+                    total_tokens += count_tokens(contexts[i])
+                    try:
+                        gain = await tracker.add([
+                            chunk["chunk_id"] for chunk in self.researcher.context_manager.query_chunks(sub_queries[i])
+                        ])
+                    except Exception as e:
+                        # Without embeddings the gain cannot be measured, keep researching
+                        gain = 1.0
+                        if self.researcher.verbose:
+                            await stream_output(
+                                "logs",
+                                "information_gain_error",
+                                f"🚫 无法计算信息增益: {e}",
+                                self.researcher.websocket,
+                            )
+
+                    if self.researcher.verbose:
+                        await stream_output(
+                            "logs",
+                            "subquery_information_gain",
+                            f"📈 '{sub_queries[i]}' 的信息增益: {gain:.0%}，已收集 {total_tokens} tokens",
+                            self.researcher.websocket,
+                        )
+
+                    # The first completed sub-query always looks novel, judge the marginal gain from the second one on
+                    if completed > 1 and gain < cfg.research_min_information_gain:
+                        stop_reason = f"信息增益 {gain:.0%} 低于阈值 {cfg.research_min_information_gain:.0%}"
+                    elif cfg.research_token_budget and total_tokens >= cfg.research_token_budget:
+                        stop_reason = f"已收集 {total_tokens} tokens，达到预算 {cfg.research_token_budget}"
+
+                if stop_reason:
+                    break
+                launch_next()
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        if stop_reason:
+            skipped = [sub_queries[i] for i in list(running.values()) + list(pending)]
             await stream_output(
                 "logs",
-                "subqueries",
-                f"🗂️ 我将基于下面的子问题开展研究: {sub_queries}...",
+                "adaptive_research_stopped",
+                f"🛑 {stop_reason}，提前结束研究并跳过 {len(skipped)} 个子问题: {skipped}",
                 self.researcher.websocket,
-                True,
-                sub_queries,
             )
 
-        # Using asyncio.gather to process the sub_queries asynchronously
-        context = await asyncio.gather(
-            *[
-                self._process_sub_query(sub_query, scraped_data)
-                for sub_query in sub_queries
-            ]
+        # Chunks found by several completed sub-queries go to the one they are most relevant to
+        return self.researcher.context_manager.assign_research_chunks(
+            [sub_query for sub_query, context in zip(sub_queries, contexts) if context is not None]
         )
-        return context
 
-    async def _process_sub_query(self, sub_query: str, scraped_data: list = []):
+    async def _get_context_by_streamed_sub_queries(self, query, scraped_data: list = []):
+        """
+        Same as _get_context_by_web_search, but streams the sub-queries from the strategic LLM and
+        starts researching each one as soon as it is generated
+        Returns:
+            context: List of context
+        """
+        research_original_query = self.researcher.report_type != "subtopic_report"
+        deduplicator = SubQueryDeduplicator(
+            self.researcher.memory.get_embeddings(),
+            self.researcher.cfg.sub_query_similarity_threshold,
+            keep=[query] if research_original_query else [],
+            lexical=self.researcher.cfg.retrieval_mode == "bm25",
+        )
+        sub_queries = []
+        tasks = []
+        original_query_task = None
+
+        try:
+            search_results = await self._initial_search(
+                query, speculative_scrape=research_original_query and not scraped_data
+            )
+            # The original query needs no planning, its research starts right away
+            if research_original_query:
+                original_query_task = asyncio.create_task(
+                    self._process_sub_query(query, scraped_data, self._take_speculative_scrape())
+                )
+
+            await stream_output(
+                "logs",
+                "planning_research",
+                f"🤔 开始生成研究策略和子问题，每个子问题生成后立即开始研究...",
+                self.researcher.websocket,
+            )
+
+            async for sub_query in stream_sub_queries(
+                query=query,
+                parent_query=self.researcher.parent_query,
+                report_type=self.researcher.report_type,
+                context=search_results,
+                cfg=self.researcher.cfg,
+                cost_callback=self.researcher.add_costs,
+            ):
+                if await deduplicator.is_duplicate(sub_query):
+                    continue
+                sub_queries.append(sub_query)
+                tasks.append(asyncio.create_task(self._process_sub_query(sub_query, scraped_data)))
+
+            if original_query_task:
+                sub_queries.append(query)
+                tasks.append(original_query_task)
+
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "subqueries",
+                    f"🗂️ 我将基于下面的子问题开展研究: {sub_queries}...",
+                    self.researcher.websocket,
+                    True,
+                    sub_queries,
+                )
+
+            await asyncio.gather(*tasks)
+            # Chunks found by several sub-queries go to the one they are most relevant to
+            return self.researcher.context_manager.assign_research_chunks(sub_queries)
+        except BaseException:
+            for task in tasks + ([original_query_task] if original_query_task else []):
+                task.cancel()
+            raise
+        finally:
+            await self._cancel_speculative_scrape()
+
+    async def _scrape_initial_search_results(self, search_results, claimed_urls: list):
+        """Scrapes the top initial search results, recording the URLs it claims so they can be released if unused"""
+        search_results = [self._normalize_search_result(result) for result in search_results]
+        search_results = search_results[:self.researcher.cfg.max_search_results_per_query]
+        new_search_results = await self._select_new_search_results(search_results)
+        claimed_urls.extend(result["href"] for result in new_search_results)
+
+        if self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "speculative_scraping",
+                f"⚡ 在规划子问题的同时预先抓取 {len(new_search_results)} 个初始搜索结果...",
+                self.researcher.websocket,
+            )
+
+        return await self._scrape_search_results(new_search_results)
+
+    def _take_speculative_scrape(self) -> Optional[asyncio.Task]:
+        """Hands the running speculative scrape over to the branch researching the original query"""
+        task, self._speculative_scrape = self._speculative_scrape, None
+        return task
+
+    async def _cancel_speculative_scrape(self):
+        """Cancels a speculative scrape that no branch used and releases the URLs it claimed"""
+        task, self._speculative_scrape = self._speculative_scrape, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        for url in self._speculative_urls:
+            self.researcher.visited_urls.discard(url)
+
+    async def _process_sub_query(self, sub_query: str, scraped_data: list = [], speculative_content: Optional[asyncio.Task] = None):
         """Takes in a sub query and scrapes urls based on it and gathers context.
 
         Args:
             sub_query (str): The sub-query generated from the original query
             scraped_data (list): Scraped data passed in
+            speculative_content (asyncio.Task): Scrape of the initial search results started while planning
 
         Returns:
             str: The context gathered from search
@@ -226,7 +558,12 @@ class ResearchConductor:
                 self.researcher.websocket,
             )
 
-        if not scraped_data:
+        if not scraped_data and speculative_content:
+            speculative_data, scraped_data = await asyncio.gather(
+                self._await_speculative_content(speculative_content), self._scrape_data_by_urls(sub_query)
+            )
+            scraped_data = speculative_data + scraped_data
+        elif not scraped_data:
             scraped_data = await self._scrape_data_by_urls(sub_query)
 
         content = await self.researcher.context_manager.get_similar_content_by_query(sub_query, scraped_data)
@@ -244,25 +581,32 @@ class ResearchConductor:
             )
         return content
 
-    async def _process_sub_query_with_vectorstore(self, sub_query: str, filter: Optional[dict] = None):
-        """Takes in a sub query and gathers context from the user provided vector store
+    async def _await_speculative_content(self, speculative_content: asyncio.Task):
+        """Waits for the speculative scrape, treating a failed scrape as no content"""
+        try:
+            scraped_content = await speculative_content
+        except Exception as e:
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "speculative_scraping_failed",
+                    f"🚫 预先抓取失败: {e}",
+                    self.researcher.websocket,
+                )
+            return []
 
-        Args:
-            sub_query (str): The sub-query generated from the original query
+        if self.researcher.vector_store:
+            await self.researcher.vector_store.aload(scraped_content)
 
-        Returns:
-            str: The context gathered from search
-        """
-        if self.researcher.verbose:
-            await stream_output(
-                "logs",
-                "running_subquery_with_vectorstore_research",
-                f"\n🔍 Running research for '{sub_query}'...",
-                self.researcher.websocket,
-            )
+        return scraped_content
 
-        content = await self.researcher.context_manager.get_similar_content_by_query_with_vectorstore(sub_query, filter)
+    async def _log_sub_query_vectorstore_context(self, sub_query: str, content: str):
+        """Logs the context gathered for a sub query from the user provided vector store
 
+        Args:
+            sub_query (str): The sub-query generated from the original query
+            content (str): The context gathered from search
+        """
         if content and self.researcher.verbose:
             await stream_output(
                 "logs", "subquery_context_window", f"📃 {content}", self.researcher.websocket
@@ -274,7 +618,6 @@ class ResearchConductor:
                 f"🤷 No content found for '{sub_query}'...",
                 self.researcher.websocket,
             )
-        return content
 
     async def _get_new_urls(self, url_set_input):
         """Gets the new urls from the given url set.
@@ -299,28 +642,119 @@ class ResearchConductor:
 
         return new_urls
 
-    async def _search_relevant_source_urls(self, query):
-        new_search_urls = []
+    async def _search_relevant_sources(self, query):
+        """Searches the query across all retrievers and keeps the full search results.
+        Args: query (str): The query to search for
+        Returns: list[dict]: The search results (href, body, ...) whose urls were not visited yet
+        """
+        # Skip retrievers that are cooling down and query the healthiest ones first
+        retrievers = retriever_health.select(self.researcher.retrievers)
+        skipped = [r.__name__ for r in self.researcher.retrievers if r not in retrievers]
+        if skipped and self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "skipping_unhealthy_retrievers",
+                f"⏸️ 暂时跳过不健康的检索器: {', '.join(skipped)}",
+                self.researcher.websocket,
+            )
 
-        # Iterate through all retrievers
-        for retriever_class in self.researcher.retrievers:
-            # Instantiate the retriever with the sub-query
-            retriever = retriever_class(query)
+        # Search all retrievers concurrently
+        all_results = await asyncio.gather(
+            *[
+                self._search_with_retriever(
+                    retriever_class, query, max_results=self.researcher.cfg.max_search_results_per_query
+                )
+                for retriever_class in retrievers
+            ]
+        )
+        search_results = [
+            self._normalize_search_result(result) for results in all_results for result in results
+        ]
 
-            # Perform the search using the current retriever
-            search_results = await asyncio.to_thread(
-                retriever.search, max_results=self.researcher.cfg.max_search_results_per_query
-            )
+        new_search_results = await self._select_new_search_results(search_results)
+        # Shuffle deterministically when recording or replaying a cassette
+        rng = random.Random(query) if get_cassette().enabled else random
+        rng.shuffle(new_search_results)
 
-            # Collect new URLs from search results
-            search_urls = [url.get("href") for url in search_results]
-            new_search_urls.extend(search_urls)
+        return new_search_results
 
-        # Get unique URLs
-        new_search_urls = await self._get_new_urls(new_search_urls)
-        random.shuffle(new_search_urls)
+    async def _search_with_retriever(self, retriever_class, query, max_results: Optional[int] = None):
+        """Runs a single retriever with a timeout and records its latency and outcome in the health registry.
+        Args:
+            retriever_class: The retriever class to search with
+            query (str): The query to search for
+            max_results (int): Maximum number of results, the retriever default is used if not set
+        Returns: list[dict]: The search results, empty if the retriever failed or timed out
+        """
+        name = retriever_class.__name__
+        timeout = self.researcher.cfg.retriever_timeout
+        kwargs = {"max_results": max_results} if max_results else {}
 
-        return new_search_urls
+        async def search():
+            # Instantiate the retriever with the query
+            retriever = retriever_class(query)
+            # Key pools of the retriever stop waiting for a key when the search times out
+            token = search_deadline.set(time.monotonic() + timeout)
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(retriever.search, **kwargs), timeout=timeout)
+            finally:
+                search_deadline.reset(token)
+
+        start = time.monotonic()
+        try:
+            results = await get_cassette().acall("search", (name, query, max_results), search)
+        except asyncio.TimeoutError:
+            retriever_health.record(name, time.monotonic() - start, "timeout",
+                                    error=f"Timed out after {timeout}s", cooldown=self.researcher.cfg.retriever_cooldown)
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "retriever_timeout",
+                    f"⏱️ 检索器 {name} 在 {timeout} 秒内未返回结果",
+                    self.researcher.websocket,
+                )
+            return []
+        except CassetteMiss:
+            # A search that was not recorded must fail the replay, not count as a retriever error
+            raise
+        except Exception as e:
+            retriever_health.record(name, time.monotonic() - start, "error",
+                                    error=str(e), cooldown=self.researcher.cfg.retriever_cooldown)
+            if self.researcher.verbose:
+                await stream_output(
+                    "logs",
+                    "retriever_error",
+                    f"🚫 检索器 {name} 搜索失败: {e}",
+                    self.researcher.websocket,
+                )
+            return []
+
+        retriever_health.record(name, time.monotonic() - start, "ok" if results else "empty",
+                                cooldown=self.researcher.cfg.retriever_cooldown)
+        return results or []
+
+    @staticmethod
+    def _normalize_search_result(result):
+        """Normalizes a retriever search result, accepting both `href` and `url` for the link
+        and plain image urls or scored image dicts for the images.
+        """
+        result = dict(result)
+        result["href"] = result.get("href") or result.get("url")
+        result["image_urls"] = [
+            image if isinstance(image, dict) else {"url": image, "score": 1}
+            for image in result.get("image_urls") or result.get("images") or []
+        ]
+        return result
+
+    async def _select_new_search_results(self, search_results):
+        """Keeps the first result of every unique URL that was not visited yet and marks those URLs as visited"""
+        new_search_urls = set(await self._get_new_urls([result.get("href") for result in search_results]))
+        new_search_results = []
+        for result in search_results:
+            if result.get("href") in new_search_urls:
+                new_search_urls.remove(result.get("href"))
+                new_search_results.append(result)
+        return new_search_results
 
     async def _scrape_data_by_urls(self, sub_query):
         """
@@ -332,7 +766,7 @@ class ResearchConductor:
         Returns:
             list: A list of scraped content results.
         """
-        new_search_urls = await self._search_relevant_source_urls(sub_query)
+        search_results = await self._search_relevant_sources(sub_query)
 
         # Log the research process if verbose mode is on
         if self.researcher.verbose:
@@ -343,10 +777,40 @@ class ResearchConductor:
                 self.researcher.websocket,
             )
 
-        # Scrape the new URLs
-        scraped_content = await self.researcher.scraper_manager.browse_urls(new_search_urls)
+        scraped_content = await self._scrape_search_results(search_results)
 
         if self.researcher.vector_store:
-            self.researcher.vector_store.load(scraped_content)
+            await self.researcher.vector_store.aload(scraped_content)
+
+        return scraped_content
+
+    async def _scrape_search_results(self, search_results):
+        """
+        Turns search results into scraped content. Results whose retriever already supplied the
+        page content are used as is, only the remaining URLs are sent to the scraper.
+
+        Args:
+            search_results (list): Normalized search results.
+
+        Returns:
+            list: A list of scraped content results.
+        """
+        retrieved_content = [
+            {
+                "url": result["href"],
+                "title": result.get("title", ""),
+                "raw_content": result["raw_content"],
+                "image_urls": result["image_urls"],
+            }
+            for result in search_results
+            if result.get("raw_content")
+        ]
+        urls_to_scrape = [result["href"] for result in search_results if not result.get("raw_content")]
+
+        scraped_content = []
+        if retrieved_content:
+            scraped_content += await self.researcher.scraper_manager.add_retrieved_content(retrieved_content)
+        if urls_to_scrape:
+            scraped_content += await self.researcher.scraper_manager.browse_urls(urls_to_scrape)
 
         return scraped_content
@@ -1,6 +1,8 @@
 from typing import Dict, Optional
 import json
 
+from ..context.packing import pack_chunks, pack_labeled_chunks, truncate_context
+from ..utils.costs import count_tokens
 from ..utils.llm import construct_subtopics
 from ..actions import (
     stream_output,
@@ -10,6 +12,12 @@ from ..actions import (
     write_conclusion
 )
 
+# Tokens of the prompt around the research context, e.g. the report instructions
+PROMPT_TOKEN_RESERVE = 2000
+
+# Labels of the research context by origin of its chunks, as in the hybrid research context
+ORIGIN_LABELS = {"local": "来自本地文档中的内容", "web": "来自网页的内容"}
+
 
 class ReportGenerator:
     """Generates reports based on research data."""
@@ -27,6 +35,54 @@ class ReportGenerator:
             "headers": self.researcher.headers,
         }
 
+    def _context_token_budget(self, reserved_tokens: int = 0) -> int:
+        """
+        Tokens left for the context in the smart LLM's window once its answer, the prompt and the
+        reserved tokens are accounted for, capped by CONTEXT_TOKEN_BUDGET when set
+        """
+        cfg = self.researcher.cfg
+        token_budget = cfg.smart_llm_context_window - cfg.smart_token_limit - PROMPT_TOKEN_RESERVE - reserved_tokens
+        if cfg.context_token_budget > 0:
+            token_budget = min(token_budget, cfg.context_token_budget)
+        return max(token_budget, 0)
+
+    def _context_chunks(self, context) -> list:
+        """The research chunks the context was built from, none for an external context"""
+        if context is not self.researcher.context:
+            return []
+        chunks = self.researcher.get_research_chunks()
+        if self.researcher.cfg.curate_sources:
+            # Only the chunks of the sources kept by the curator
+            curated = str(context)
+            chunks = [chunk for chunk in chunks if chunk.get("source") and chunk["source"] in curated]
+        return chunks
+
+    async def _pack_context(self, context, step: str, reserved_tokens: int = 0):
+        """
+        Fits the context into the context token budget. Context built by the research is rebuilt
+        from its highest-scoring unique research chunks, any other context is trimmed.
+        """
+        token_budget = self._context_token_budget(reserved_tokens)
+        chunks = self._context_chunks(context)
+        if any(chunk.get("origin") for chunk in chunks):
+            context, _ = pack_labeled_chunks(chunks, token_budget, ORIGIN_LABELS)
+        elif chunks:
+            context, _ = pack_chunks(chunks, token_budget)
+        else:
+            context = truncate_context(context, token_budget)
+
+        await self._log_context_tokens(context, step)
+        return context
+
+    async def _log_context_tokens(self, context, step: str):
+        if self.researcher.verbose:
+            await stream_output(
+                "logs",
+                "context_tokens",
+                f"🧮 {step}的上下文共 {count_tokens(str(context))} tokens",
+                self.researcher.websocket,
+            )
+
     async def write_report(self, existing_headers: list = [], relevant_written_contents: list = [], ext_context=None) -> str:
         """
         Write a report based on existing headers and relevant contents.
@@ -61,7 +117,10 @@ class ReportGenerator:
             )
 
         report_params = self.research_params.copy()
-        report_params["context"] = context
+        # The written contents and headers of the other subtopics share the prompt with the context
+        report_params["context"] = await self._pack_context(
+            context, "撰写报告", reserved_tokens=count_tokens(str(existing_headers) + str(relevant_written_contents))
+        )
 
         if self.researcher.report_type == "subtopic_report":
             report_params.update({
@@ -103,6 +162,7 @@ class ReportGenerator:
                 self.researcher.websocket,
             )
 
+        await self._log_context_tokens(report_content, "撰写结论")
         conclusion = await write_conclusion(
             query=self.researcher.query,
             context=report_content,
@@ -134,7 +194,7 @@ class ReportGenerator:
 
         introduction = await write_report_introduction(
             query=self.researcher.query,
-            context=self.researcher.context,
+            context=await self._pack_context(self.researcher.context, "撰写引言"),
             agent_role_prompt=self.researcher.cfg.agent_role or self.researcher.role,
             config=self.researcher.cfg,
             websocket=self.researcher.websocket,
@@ -163,7 +223,7 @@ class ReportGenerator:
 
         subtopics = await construct_subtopics(
             task=self.researcher.query,
-            data=self.researcher.context,
+            data=await self._pack_context(self.researcher.context, "生成子主题"),
             config=self.researcher.cfg,
             subtopics=self.researcher.subtopics,
         )
@@ -191,7 +251,7 @@ class ReportGenerator:
         draft_section_titles = await generate_draft_section_titles(
             query=self.researcher.query,
             current_subtopic=current_subtopic,
-            context=self.researcher.context,
+            context=await self._pack_context(self.researcher.context, "生成章节标题"),
             role=self.researcher.cfg.agent_role or self.researcher.role,
             websocket=self.researcher.websocket,
             config=self.researcher.cfg,
@@ -0,0 +1,124 @@
+"""
+Record/replay cassettes for the external calls of a research run.
+
+With CASSETTE_MODE=record every search response, scraped page, LLM completion and embedding
+is written to a compressed cassette directory (CASSETTE_DIR). With CASSETTE_MODE=replay the
+same calls are answered from the cassette without touching the network, so a full
+`GPTResearcher.conduct_research` can run offline and deterministically on a fixed corpus.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, List
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+# Dates in prompts change every day, they are left out of the cassette keys
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a call was never recorded"""
+
+
+class Cassette:
+    """A directory of gzipped JSON responses keyed by a hash of the call."""
+
+    def __init__(self, path: str = "./cassettes", mode: str = "off"):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Invalid cassette mode '{mode}'. Valid options are: {', '.join(CASSETTE_MODES)}.")
+        self.path = path
+        self.mode = mode
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(_DATE_PATTERN.sub("<date>", serialized).encode("utf-8")).hexdigest()
+
+    def _file(self, kind: str, key: str) -> str:
+        return os.path.join(self.path, kind, f"{key}.json.gz")
+
+    def load(self, kind: str, *parts: Any) -> Any:
+        file_path = self._file(kind, self.key(*parts))
+        if not os.path.exists(file_path):
+            raise CassetteMiss(f"No recorded '{kind}' response for {parts!r:.200} in {self.path}")
+        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, kind: str, value: Any, *parts: Any) -> None:
+        file_path = self._file(kind, self.key(*parts))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see partial cassettes
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+
+    def call(self, kind: str, parts: tuple, fn: Callable[[], Any]) -> Any:
+        """Replays a recorded response, or runs `fn` and records its result when recording"""
+        if self.replaying:
+            return self.load(kind, *parts)
+        result = fn()
+        if self.recording:
+            self.save(kind, result, *parts)
+        return result
+
+    async def acall(self, kind: str, parts: tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of `call`"""
+        if self.replaying:
+            return self.load(kind, *parts)
+        result = await fn()
+        if self.recording:
+            self.save(kind, result, *parts)
+        return result
+
+
+@lru_cache(maxsize=None)
+def _get_cassette(path: str, mode: str) -> Cassette:
+    return Cassette(path, mode)
+
+
+def get_cassette() -> Cassette:
+    """Returns the cassette configured by the CASSETTE_MODE and CASSETTE_DIR env vars"""
+    return _get_cassette(
+        os.getenv("CASSETTE_DIR", "./cassettes"),
+        os.getenv("CASSETTE_MODE", "off").lower(),
+    )
+
+
+def wrap_embeddings(embeddings):
+    """Wraps an embeddings provider so its vectors are recorded to / replayed from the cassette"""
+    cassette = get_cassette()
+    if not cassette.enabled or embeddings is None:
+        return embeddings
+
+    from langchain_core.embeddings import Embeddings
+
+    class CassetteEmbeddings(Embeddings):
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return cassette.call(
+                "embeddings", (type(embeddings).__name__, texts), lambda: embeddings.embed_documents(texts)
+            )
+
+        def embed_query(self, text: str) -> List[float]:
+            return cassette.call(
+                "embeddings", (type(embeddings).__name__, "query", text), lambda: embeddings.embed_query(text)
+            )
+
+    return CassetteEmbeddings()
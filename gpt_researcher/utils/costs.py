@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import tiktoken
 
 # Per OpenAI Pricing Page: https://openai.com/api/pricing/
@@ -8,18 +10,44 @@ IMAGE_INFERENCE_COST = 0.003825
 EMBEDDING_COST = 0.02 / 1000000 # Assumes new ada-3-small
 
 
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = ENCODING_MODEL):
+    """
+    Loading an encoding is expensive, it is done once per process. Returns None when the encoding
+    cannot be loaded, e.g. when tiktoken cannot download it in an air-gapped deployment.
+    """
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_model_encoding(model: str):
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # Not an OpenAI model, its tokenizer is unknown
+        encoding_name = ENCODING_MODEL
+    return get_encoding(encoding_name)
+
+
+def count_tokens(content: str, model: str = None) -> int:
+    content = content or ""
+    encoding = get_model_encoding(model) if model else get_encoding()
+    if encoding is None:
+        # Rough estimate, about 4 bytes per token
+        return len(content.encode("utf-8")) // 4
+    return len(encoding.encode(content, disallowed_special=()))
+
+
 # Cost estimation is via OpenAI libraries and models. May vary for other models
 def estimate_llm_cost(input_content: str, output_content: str) -> float:
-    encoding = tiktoken.get_encoding(ENCODING_MODEL)
-    input_tokens = encoding.encode(input_content)
-    output_tokens = encoding.encode(output_content)
-    input_costs = len(input_tokens) * INPUT_COST_PER_TOKEN
-    output_costs = len(output_tokens) * OUTPUT_COST_PER_TOKEN
+    input_costs = count_tokens(input_content) * INPUT_COST_PER_TOKEN
+    output_costs = count_tokens(output_content) * OUTPUT_COST_PER_TOKEN
     return input_costs + output_costs
 
 
 def estimate_embedding_cost(model, docs):
-    encoding = tiktoken.encoding_for_model(model)
-    total_tokens = sum(len(encoding.encode(str(doc))) for doc in docs)
+    total_tokens = sum(count_tokens(doc if isinstance(doc, str) else str(doc), model) for doc in docs)
     return total_tokens * EMBEDDING_COST
-
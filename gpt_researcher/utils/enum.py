@@ -12,6 +12,7 @@ class ReportType(Enum):
 
 class ReportSource(Enum):
     Web = "web"
+    Fast = "fast"
     Local = "local"
     LangChainDocuments = "langchain_documents"
     LangChainVectorStore = "langchain_vectorstore"
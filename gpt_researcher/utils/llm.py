@@ -10,6 +10,7 @@ from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
 
 from ..prompts import generate_subtopics_prompt
+from .cassette import get_cassette
 from .costs import estimate_llm_cost
 from .validators import Subtopics
 
@@ -51,6 +52,10 @@ async def create_chat_completion(
         raise ValueError(
             f"Max tokens cannot be more than 16,000, but got {max_tokens}")
 
+    cassette = get_cassette()
+    if cassette.replaying:
+        return cassette.load("llm", llm_provider, model, messages)
+
     # Get the provider from supported providers
     provider = get_llm(llm_provider, model=model, temperature=temperature,
                        max_tokens=max_tokens, **(llm_kwargs or {}))
@@ -62,6 +67,9 @@ async def create_chat_completion(
             messages, stream, websocket
         )
 
+        if cassette.recording:
+            cassette.save("llm", response, llm_provider, model, messages)
+
         if cost_callback:
             llm_costs = estimate_llm_cost(str(messages), response)
             cost_callback(llm_costs)
@@ -0,0 +1,158 @@
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from .costs import get_encoding, get_model_encoding
+
+# Text is cut at line breaks first, then only the paragraphs longer than a chunk are cut at the
+# end of their sentences, and the sentences longer than a chunk at their clauses.
+_PARAGRAPH_END = re.compile(r"\n\s*")
+# A sentence ends at CJK or Latin end punctuation, with its closing quotes or brackets. Latin
+# periods only end a sentence before whitespace, so 3.14 or e.g. stay whole.
+_SENTENCE_END = re.compile(r"(?:[。！？；!?;…]+[”’」』）》】\"')\]]*|\.(?=\s)[\"')\]]*)\s*")
+_CLAUSE_END = re.compile(r"[，、,：:]\s*")
+_SEPARATORS = (_PARAGRAPH_END, _SENTENCE_END, _CLAUSE_END)
+
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class SentenceTextSplitter(TextSplitter):
+    """
+    Splits text into chunks of whole sentences, measured in tokens.
+    Paragraphs longer than a chunk are cut at the end of their sentences, CJK (。！？；) or Latin
+    end punctuation, so Chinese pages, which have no spaces for RecursiveCharacterTextSplitter's
+    separators, are cut at sentence boundaries too. Each piece is tokenized once, and chunks are
+    computed as (start, end) offsets into the source text; only the final chunks are copied.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 300,
+        chunk_overlap: int = 30,
+        model: Optional[str] = None,
+        add_token_count: bool = False,
+        **kwargs,
+    ):
+        """
+        Args:
+            chunk_size: Maximum number of tokens of a chunk. A single word longer than that is
+                not cut.
+            chunk_overlap: Maximum number of tokens of the trailing sentences of a chunk repeated
+                at the start of the next one
+            model: Model whose tokenizer measures the chunks, the default encoding when None
+            add_token_count: Whether to store the token count of each chunk in its metadata
+        """
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._encoding = get_model_encoding(model) if model else get_encoding()
+        self._add_token_count = add_token_count
+
+    def _count(self, texts: List[str]) -> List[int]:
+        if self._encoding is None:
+            # Rough estimate when the tokenizer is unavailable, about 4 bytes per token
+            return [-(-len(text.encode("utf-8")) // 4) for text in texts]
+        return [len(tokens) for tokens in self._encoding.encode_ordinary_batch(texts)]
+
+    def _segments(self, text: str, pattern: re.Pattern, start: int, end: int) -> List[Tuple[int, int]]:
+        segments = []
+        for match in pattern.finditer(text, start, end):
+            if match.end() > start:
+                segments.append((start, match.end()))
+                start = match.end()
+        if start < end:
+            segments.append((start, end))
+        return segments
+
+    def _fit(self, text: str, segments: List[Tuple[int, int]], level: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """Measures the segments and cuts the ones longer than a chunk at the separators from `level` on"""
+        lengths = self._count([text[start:end] for start, end in segments])
+        if all(length <= self._chunk_size for length in lengths):
+            return segments, lengths
+
+        fitted, fitted_lengths = [], []
+        for (start, end), length in zip(segments, lengths):
+            pieces = []
+            if length > self._chunk_size:
+                next_level = level
+                while len(pieces) <= 1 and next_level < len(_SEPARATORS):
+                    pieces = self._segments(text, _SEPARATORS[next_level], start, end)
+                    next_level += 1
+                if len(pieces) <= 1:
+                    pieces = self._windows(text, start, end, length)
+            if len(pieces) <= 1:
+                fitted.append((start, end))
+                fitted_lengths.append(length)
+                continue
+            pieces, piece_lengths = self._fit(text, pieces, next_level)
+            fitted.extend(pieces)
+            fitted_lengths.extend(piece_lengths)
+        return fitted, fitted_lengths
+
+    def _windows(self, text: str, start: int, end: int, length: int) -> List[Tuple[int, int]]:
+        """Cuts a segment without punctuation into pieces of about a chunk, at spaces if there are any"""
+        count = -(-length // self._chunk_size)
+        step = -(-(end - start) // count)
+        windows = []
+        while start < end:
+            cut = min(start + step, end)
+            if cut < end:
+                space = text.rfind(" ", start + 1, cut)
+                if space > start + step // 2:
+                    cut = space + 1
+            windows.append((start, cut))
+            start = cut
+        return windows
+
+    def split_offsets_with_tokens(self, text: str) -> List[Tuple[int, int, int]]:
+        """Returns the (start, end, tokens) of the chunks of the text"""
+        if not text:
+            return []
+        segments, lengths = self._fit(text, [(0, len(text))], 0)
+
+        chunks = []
+        i = 0
+        while i < len(segments):
+            j, total = i + 1, lengths[i]
+            while j < len(segments) and total + lengths[j] <= self._chunk_size:
+                total += lengths[j]
+                j += 1
+            start, end = _trim(text, segments[i][0], segments[j - 1][1])
+            if start < end:
+                chunks.append((start, end, total))
+            if j == len(segments):
+                break
+
+            # The next chunk starts with the last sentences of this one that fit in the overlap
+            k, overlap = j, 0
+            while k - 1 > i and overlap + lengths[k - 1] <= self._chunk_overlap:
+                k -= 1
+                overlap += lengths[k]
+            i = k
+        return chunks
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Returns the (start, end) offsets of the chunks of the text"""
+        return [(start, end) for start, end, _ in self.split_offsets_with_tokens(text)]
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            for start, end, tokens in self.split_offsets_with_tokens(text):
+                chunk_metadata = dict(metadata)
+                if self._add_start_index:
+                    chunk_metadata["start_index"] = start
+                if self._add_token_count:
+                    chunk_metadata["tokens"] = tokens
+                documents.append(Document(page_content=text[start:end], metadata=chunk_metadata))
+        return documents
@@ -0,0 +1,536 @@
+"""
+Persistent langchain vector store on local disk
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from ..context.ann import IVFIndex
+from ..context.ranking import normalize, top_k_by_score
+
+# Unfiltered searches score the rows of a segment in blocks, so the float32 copy of a block stays small
+_SEARCH_BLOCK = 65536
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    dim INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_position ON documents (segment, row);
+CREATE TABLE IF NOT EXISTS metadata (
+    document TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS metadata_filter ON metadata (key, value);
+CREATE INDEX IF NOT EXISTS metadata_document ON metadata (document);
+CREATE TABLE IF NOT EXISTS deleted (
+    segment INTEGER NOT NULL,
+    row INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deleted_segment ON deleted (segment);
+"""
+
+
+class _Segment:
+    def __init__(self, id: int, path: str, rows: int, dim: int):
+        self.id = id
+        self.path = path
+        self.rows = rows
+        self.dim = dim
+        self.deleted = np.empty(0, dtype=np.int64)
+        self._vectors: Optional[np.memmap] = None
+        self._ann: Optional[IVFIndex] = None
+
+    def open(self) -> None:
+        """
+        Maps the vectors and loads the IVF index. A mapped file stays readable after a merge removes
+        it, so segments are opened before the store lock is released.
+        """
+        if self._vectors is not None:
+            return
+        if not self.rows:
+            # A merge of deleted rows only, empty files cannot be mapped
+            self._vectors = np.empty((0, self.dim), dtype=np.float16)
+            return
+        # The pages are shared through the page cache by every process reading the store
+        vectors = np.memmap(self.path, dtype=np.float16, mode="r", shape=(self.rows, self.dim))
+        if os.path.exists(f"{self.path}.ivf.npz"):
+            self._ann = IVFIndex.load(f"{self.path}.ivf.npz")
+        self._vectors = vectors
+
+    @property
+    def vectors(self) -> np.memmap:
+        self.open()
+        return self._vectors
+
+    @property
+    def ann(self) -> Optional[IVFIndex]:
+        """IVF index of the segment, built when it was merged from enough rows"""
+        self.open()
+        return self._ann
+
+    def remove_files(self) -> None:
+        for path in (self.path, f"{self.path}.ivf.npz"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Langchain vector store kept in a local folder, shared by the processes that open it.
+
+    Normalized embeddings are stored as float16 in append-only segment files that are memory-mapped,
+    and the documents in SQLite, where every scalar metadata value is indexed for filters. Opening
+    the store reads neither the vectors nor the documents, so it is immediate whatever its size,
+    and a search reads the vectors through the page cache shared with the other processes.
+
+    Each add writes a new segment and a delete only records the deleted rows. When there are more
+    than `max_segments` segments, a background thread merges the smallest ones and drops their
+    deleted rows; `merge` merges all of them. Merged segments of at least `ann_min_rows` rows get an
+    IVF index, and their unfiltered searches score only the rows of the `n_probe` lists closest to
+    the query instead of converting every float16 row. Searches go on during merges, in this process
+    or another one, and a search that overlapped a merge is scored again. Only one process should
+    write to the store at a time.
+
+    Filters are dicts of metadata values, e.g. {"source": url}, or {"source": {"$in": urls}}.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding: Embeddings,
+        max_segments: int = 8,
+        merge_in_background: bool = True,
+        ann_min_rows: int = 10000,
+        n_probe: int = 8,
+    ):
+        self.path = path
+        self.embedding = embedding
+        self.max_segments = max(2, max_segments)
+        self.merge_in_background = merge_in_background
+        self.ann_min_rows = ann_min_rows
+        self.n_probe = n_probe
+        os.makedirs(os.path.join(path, "segments"), exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(
+            os.path.join(path, "store.sqlite"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._segments: Dict[int, _Segment] = {}
+        self._data_version: Optional[int] = None
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self) -> None:
+        """Waits for a background merge and closes the database"""
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+        with self._lock:
+            self._conn.close()
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        if path is None:
+            raise ValueError("LocalVectorStore.from_texts needs the path of the store folder.")
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self._add(texts, vectors, metadatas, ids)
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[Tuple[str, Sequence[float]]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Adds texts with embeddings computed beforehand"""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        return self._add(texts, [vector for _, vector in text_embeddings], metadatas, ids)
+
+    def _add(self, texts: List[str], vectors, metadatas: Optional[List[dict]], ids: Optional[List[str]]) -> List[str]:
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        if not len(texts) == len(metadatas) == len(ids):
+            raise ValueError("The number of texts, metadatas and ids must match.")
+        # The last of repeated IDs wins, like separate upserts
+        positions = list({doc_id: i for i, doc_id in enumerate(ids)}.values())
+        if len(positions) < len(ids):
+            texts, metadatas, ids = ([values[i] for i in positions] for values in (texts, metadatas, ids))
+            vectors = [vectors[i] for i in positions]
+        vectors = normalize(vectors)
+
+        with self._lock:
+            row = self._conn.execute("SELECT dim FROM segments LIMIT 1").fetchone()
+            if row is not None and row[0] != vectors.shape[1]:
+                raise ValueError(f"Embeddings of dimension {vectors.shape[1]} cannot be added to a store of dimension {row[0]}.")
+            file = self._write_segment_file([vectors])
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._delete_documents(ids)
+                segment = self._conn.execute(
+                    "INSERT INTO segments (file, rows, dim) VALUES (?, ?, ?)", (file, len(ids), vectors.shape[1])
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO documents (id, segment, row, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (doc_id, segment, i, text, json.dumps(metadata, ensure_ascii=False, default=str))
+                        for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT INTO metadata (document, key, value) VALUES (?, ?, ?)",
+                    (
+                        (doc_id, key, value)
+                        for doc_id, metadata in zip(ids, metadatas)
+                        for key, value in metadata.items()
+                        if isinstance(value, (str, int, float)) or value is None
+                    ),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                os.remove(os.path.join(self.path, "segments", file))
+                raise
+            self._data_version = None
+            segments = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+        if segments > self.max_segments:
+            self._start_merge()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._delete_documents(list(ids))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._data_version = None
+        return deleted > 0
+
+    def _delete_documents(self, ids: List[str]) -> int:
+        """Removes the documents and records their rows as deleted, in the open transaction"""
+        deleted = 0
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(
+                f"INSERT INTO deleted (segment, row) SELECT segment, row FROM documents WHERE id IN ({placeholders})", batch
+            )
+            self._conn.execute(f"DELETE FROM metadata WHERE document IN ({placeholders})", batch)
+            deleted += self._conn.execute(f"DELETE FROM documents WHERE id IN ({placeholders})", batch).rowcount
+        return deleted
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        ids = list(ids)
+        documents = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM documents WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                documents.extend(
+                    Document(id=doc_id, page_content=text, metadata=json.loads(metadata)) for doc_id, text, metadata in rows
+                )
+        return documents
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter=filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter=filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, filter=filter)]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Documents most similar to the embedding with their cosine similarity, sorted by descending
+        similarity. Only documents whose metadata match the filter are scored.
+        """
+        query_vector = normalize(embedding)
+        for attempt in range(3):
+            with self._lock:
+                segments = self._open_segments()
+                allowed = self._filter_rows(filter) if filter else None
+
+            positions, scores = self._score(segments, allowed, query_vector, k)
+            with self._lock, self._snapshot():
+                self._refresh()
+                # A merge committed since the segments were loaded moved their documents, they are scored again
+                if attempt < 2 and any(segment.id not in self._segments for segment in segments):
+                    continue
+                documents = {}
+                for segment, row in positions:
+                    found = self._conn.execute(
+                        "SELECT id, text, metadata FROM documents WHERE segment = ? AND row = ?", (segment, row)
+                    ).fetchone()
+                    if found is not None:
+                        documents[(segment, row)] = Document(id=found[0], page_content=found[1], metadata=json.loads(found[2]))
+            # Documents deleted since they were scored are left out
+            return [
+                (documents[position], float(score)) for position, score in zip(positions, scores) if position in documents
+            ]
+
+    def _score(
+        self, segments: List[_Segment], allowed: Optional[Dict[int, np.ndarray]], query_vector: np.ndarray, k: int
+    ) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+        """(segment, row) positions of the k rows of the opened segments most similar to the query, and their scores"""
+        found_scores, found_positions = [], []
+        for segment in segments:
+            if allowed is not None:
+                rows = allowed.get(segment.id)
+                if rows is None:
+                    continue
+                selected, scores = top_k_by_score(np.asarray(segment.vectors[rows], dtype=np.float32) @ query_vector, k)
+                found_scores.append(scores)
+                found_positions.extend((segment.id, int(row)) for row in rows[selected])
+                continue
+            if segment.ann is not None:
+                rows = segment.ann.candidates(query_vector, self.n_probe)
+                rows = rows[~np.isin(rows, segment.deleted)]
+                selected, scores = top_k_by_score(np.asarray(segment.vectors[rows], dtype=np.float32) @ query_vector, k)
+                found_scores.append(scores)
+                found_positions.extend((segment.id, int(row)) for row in rows[selected])
+                continue
+            for start in range(0, segment.rows, _SEARCH_BLOCK):
+                block = np.asarray(segment.vectors[start:start + _SEARCH_BLOCK], dtype=np.float32)
+                scores = block @ query_vector
+                deleted = segment.deleted[(segment.deleted >= start) & (segment.deleted < start + len(block))]
+                scores[deleted - start] = -np.inf
+                # Deleted rows score -inf, below any cosine similarity
+                selected, scores = top_k_by_score(scores, k, min_score=-2.0)
+                found_scores.append(scores)
+                found_positions.extend((segment.id, start + int(row)) for row in selected)
+
+        if not found_positions:
+            return [], np.empty(0, dtype=np.float32)
+        selected, scores = top_k_by_score(np.concatenate(found_scores), k)
+        return [found_positions[i] for i in selected], scores
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities of normalized vectors
+        return lambda similarity: similarity
+
+    def _filter_rows(self, filter: dict) -> Dict[int, np.ndarray]:
+        """Sorted rows of each segment whose document matches every condition of the filter"""
+        conditions, values = [], []
+        for key, value in filter.items():
+            if isinstance(value, dict):
+                if set(value) != {"$in"}:
+                    raise ValueError(f"Unsupported filter on '{key}': only values and $in are supported.")
+                options = list(value["$in"])
+            else:
+                options = [value]
+            if not options:
+                return {}
+            conditions.append(
+                f"id IN (SELECT document FROM metadata WHERE key = ? AND value IN ({','.join('?' * len(options))}))"
+            )
+            values.extend([key, *options])
+        rows: Dict[int, List[int]] = {}
+        for segment, row in self._conn.execute(
+            f"SELECT segment, row FROM documents WHERE {' AND '.join(conditions)} ORDER BY segment, row", values
+        ):
+            rows.setdefault(segment, []).append(row)
+        return {segment: np.array(segment_rows, dtype=np.int64) for segment, segment_rows in rows.items()}
+
+    @contextmanager
+    def _snapshot(self):
+        """Read transaction, so that reads see no commit of another connection in between"""
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self._conn.execute("COMMIT")
+
+    def _refresh(self) -> None:
+        """Reloads the segments and deleted rows when the database changed, e.g. in another process"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        segments = {}
+        for segment_id, file, rows, dim in self._conn.execute("SELECT id, file, rows, dim FROM segments"):
+            segments[segment_id] = self._segments.get(segment_id) or _Segment(
+                segment_id, os.path.join(self.path, "segments", file), rows, dim
+            )
+        deleted: Dict[int, List[int]] = {}
+        for segment_id, row in self._conn.execute("SELECT segment, row FROM deleted ORDER BY segment, row"):
+            deleted.setdefault(segment_id, []).append(row)
+        for segment_id, segment in segments.items():
+            segment.deleted = np.array(deleted.get(segment_id, ()), dtype=np.int64)
+        self._segments = segments
+        self._data_version = version
+
+    def _open_segments(self) -> List[_Segment]:
+        """Refreshes and opens the segments, in the store lock so that a merge cannot remove them meanwhile"""
+        for attempt in range(3):
+            with self._snapshot():
+                self._refresh()
+            try:
+                for segment in self._segments.values():
+                    segment.open()
+                return list(self._segments.values())
+            except FileNotFoundError:
+                # Merged away by another process since the segments were loaded
+                if attempt == 2:
+                    raise
+                self._data_version = None
+
+    def _write_segment_file(self, blocks: Iterable[np.ndarray]) -> str:
+        file = f"{uuid.uuid4().hex}.f16"
+        path = os.path.join(self.path, "segments", file)
+        with open(f"{path}.tmp", "wb") as f:
+            for block in blocks:
+                np.asarray(block, dtype=np.float16).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        return file
+
+    def _start_merge(self) -> None:
+        if not self.merge_in_background:
+            self._merge(self.max_segments // 2)
+            return
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+        self._merge_thread = threading.Thread(target=self._merge, args=(self.max_segments // 2,), daemon=True)
+        self._merge_thread.start()
+
+    def merge(self) -> None:
+        """Merges all segments into one and drops the deleted rows"""
+        self._merge(1)
+
+    def _merge(self, target_segments: int) -> None:
+        """Merges the smallest segments into one, so at most target_segments segments are left"""
+        with self._merge_lock:
+            with self._lock:
+                segments = sorted(self._open_segments(), key=lambda segment: segment.rows)
+                if len(segments) <= target_segments and not any(len(segment.deleted) for segment in segments):
+                    return
+                segments = segments[:max(2, len(segments) - target_segments + 1)]
+                live = [np.setdiff1d(np.arange(segment.rows), segment.deleted) for segment in segments]
+
+            # The merged file is written without the lock, searches and adds go on meanwhile
+            file = self._write_segment_file(
+                segment.vectors[rows[start:start + _SEARCH_BLOCK]]
+                for segment, rows in zip(segments, live)
+                for start in range(0, len(rows), _SEARCH_BLOCK)
+            )
+            offsets = np.concatenate(([0], np.cumsum([len(rows) for rows in live])))
+            merged_segment = _Segment(0, os.path.join(self.path, "segments", file), int(offsets[-1]), segments[0].dim)
+            if merged_segment.rows >= max(1, self.ann_min_rows):
+                ann = IVFIndex(n_probe=self.n_probe)
+                ann.train(merged_segment.vectors)
+                ann.add(merged_segment.vectors)
+                ann.save(f"{merged_segment.path}.ivf.npz")
+
+            with self._lock:
+                old_ids = [segment.id for segment in segments]
+                placeholders = ",".join("?" * len(old_ids))
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    merged = self._conn.execute(
+                        "INSERT INTO segments (file, rows, dim) VALUES (?, ?, ?)", (file, merged_segment.rows, merged_segment.dim)
+                    ).lastrowid
+                    # Rows deleted during the merge are deleted in the merged segment
+                    deleted_since = self._conn.execute(
+                        f"SELECT segment, row FROM deleted WHERE segment IN ({placeholders})", old_ids
+                    ).fetchall()
+                    index = {segment.id: i for i, segment in enumerate(segments)}
+                    for segment_id, row in deleted_since:
+                        rows = live[index[segment_id]]
+                        position = np.searchsorted(rows, row)
+                        if position < len(rows) and rows[position] == row:
+                            self._conn.execute(
+                                "INSERT INTO deleted (segment, row) VALUES (?, ?)",
+                                (merged, int(offsets[index[segment_id]] + position)),
+                            )
+                    self._conn.executemany(
+                        "UPDATE documents SET segment = ?, row = ? WHERE segment = ? AND row = ?",
+                        (
+                            (merged, int(offset + i), segment.id, int(row))
+                            for segment, rows, offset in zip(segments, live, offsets)
+                            for i, row in enumerate(rows)
+                        ),
+                    )
+                    self._conn.execute(f"DELETE FROM deleted WHERE segment IN ({placeholders})", old_ids)
+                    self._conn.execute(f"DELETE FROM segments WHERE id IN ({placeholders})", old_ids)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    merged_segment.remove_files()
+                    raise
+                self._data_version = None
+
+            # Searches that loaded the old segments opened them in the lock, their mappings keep the
+            # removed files readable until they are closed
+            for segment in segments:
+                segment.remove_files()
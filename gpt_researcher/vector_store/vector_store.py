@@ -1,37 +1,235 @@
 """
 Wrapper for langchain vector store
 """
-from typing import List, Dict
+import asyncio
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from langchain.docstore.document import Document
 from langchain.vectorstores import VectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from ..memory.embeddings import embed_queries
+from ..utils.text_splitter import SentenceTextSplitter
+
+
+def _chunk_id(document: Document) -> str:
+    """Content hash of a chunk, the same for the same text of the same source in every run"""
+    return hashlib.sha256(
+        f"{document.metadata.get('source', '')}\n{document.page_content}".encode("utf-8")
+    ).hexdigest()
+
 
 class VectorStoreWrapper:
     """
     A Wrapper for LangchainVectorStore to handle GPT-Researcher Document Type
+
+    Chunks are added with their content hash as ID, and chunks the store already has are skipped, so
+    loading the same pages again in a later research does not duplicate them. Whether the store has
+    a chunk is asked with `get_by_ids`. Stores without it can keep the IDs of the chunks added in
+    a sidecar `manifest_path` file instead. The manifest is only trusted for those stores, a store
+    answering `get_by_ids` may have lost chunks the manifest lists, e.g. a new in-memory store.
+
+    Documents passed to `aload` are split and queued in batches, and a background task adds the
+    batches to the vector store with `aadd_documents`, so the research goes on while they are
+    embedded. At most `max_pending` batches wait in the queue, `aload` waits for room beyond that.
+    `flush` waits until every queued batch is in the vector store and stops the background task,
+    the next `aload` starts a new one.
     """
-    def __init__(self, vector_store : VectorStore):
+    def __init__(
+        self,
+        vector_store : VectorStore,
+        batch_size: int = 64,
+        max_pending: int = 8,
+        manifest_path: Optional[str] = None,
+    ):
         self.vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        self.manifest_path = manifest_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._errors: List[Exception] = []
+        # IDs of the chunks added or queued by this wrapper
+        self._known_ids: Set[str] = set()
+        # IDs of the chunks added to the store by earlier runs, used when the store cannot be asked
+        self._manifest_ids: Set[str] = self._read_manifest()
+        self._supports_get_by_ids = True
 
     def load(self, documents):
         """
         Load the documents into vector_store
-        Translate to langchain doc type, split to chunks then load
+        Translate to langchain doc type, split to chunks then load the chunks it does not have yet
         """
         langchain_documents = self._create_langchain_documents(documents)
         splitted_documents = self._split_documents(langchain_documents)
-        self.vector_store.add_documents(splitted_documents)
-    
+        new_documents, ids = self._reserve_new_chunks(splitted_documents)
+        new_ids = set(ids) - self._ids_in_store(ids)
+        new_documents = [doc for doc, chunk_id in zip(new_documents, ids) if chunk_id in new_ids]
+        if new_documents:
+            self._add_batch(new_documents)
+
+    async def aload(self, documents):
+        """
+        Queue the documents to be loaded into vector_store in the background
+        Returns once their batches are queued, call flush to wait until they are loaded
+        """
+        langchain_documents = self._create_langchain_documents(documents)
+        if not langchain_documents:
+            return
+        splitted_documents = await asyncio.to_thread(self._split_documents, langchain_documents)
+        # IDs are reserved before the store is asked, so concurrent loads of a page add it once
+        new_documents, ids = self._reserve_new_chunks(splitted_documents)
+        new_ids = set(ids) - await asyncio.to_thread(self._ids_in_store, ids)
+        new_documents = [doc for doc, chunk_id in zip(new_documents, ids) if chunk_id in new_ids]
+
+        queue = self._ensure_worker()
+        for start in range(0, len(new_documents), self.batch_size):
+            await queue.put(new_documents[start:start + self.batch_size])
+
+    async def flush(self):
+        """Wait until the queued documents are loaded, raising the first error of the background task"""
+        queue, worker = self._queue, self._worker
+        # Documents queued from now on go to a new background task
+        self._queue = self._worker = None
+        if worker is not None and not worker.done() and worker.get_loop() is asyncio.get_running_loop():
+            await queue.join()
+            await queue.put(None)
+            await worker
+        if self._errors:
+            error, self._errors = self._errors[0], []
+            raise error
+
+    def compact(self, ids: Optional[Iterable[str]] = None, batch_size: int = 1000) -> int:
+        """
+        Remove the duplicate chunks of vector_store, e.g. added by earlier versions without content
+        hash IDs. One chunk is kept per source and text, under its content hash ID so later loads
+        skip it; kept chunks stored under another ID are added again, which embeds them again.
+        Args:
+            ids: IDs of the documents to compact. All of them by default, for the in-memory, FAISS
+                and Chroma stores that can list their IDs
+            batch_size: Number of documents fetched and deleted per call
+        Returns:
+            Number of documents removed
+        """
+        ids = list(ids) if ids is not None else self._all_ids()
+        kept: Dict[str, Document] = {}
+        removed: List[str] = []
+        for start in range(0, len(ids), batch_size):
+            for document in self.vector_store.get_by_ids(ids[start:start + batch_size]):
+                chunk_id = _chunk_id(document)
+                if chunk_id not in kept:
+                    kept[chunk_id] = document
+                elif document.id == chunk_id:
+                    removed.append(kept[chunk_id].id)
+                    kept[chunk_id] = document
+                else:
+                    removed.append(document.id)
+
+        rekeyed = {chunk_id: document for chunk_id, document in kept.items() if document.id != chunk_id}
+        # Chunks are added under their new ID before the old one is deleted, so none is lost on failure
+        rekeyed_documents = [Document(page_content=doc.page_content, metadata=doc.metadata) for doc in rekeyed.values()]
+        for start in range(0, len(rekeyed_documents), batch_size):
+            self.vector_store.add_documents(
+                rekeyed_documents[start:start + batch_size],
+                ids=list(rekeyed)[start:start + batch_size],
+            )
+        removed.extend(document.id for document in rekeyed.values())
+        for start in range(0, len(removed), batch_size):
+            self.vector_store.delete(removed[start:start + batch_size])
+
+        self._known_ids.update(kept)
+        self._append_manifest(list(rekeyed))
+        return len(removed) - len(rekeyed)
+
+    def _all_ids(self) -> List[str]:
+        store = self.vector_store
+        if isinstance(getattr(store, "store", None), dict):
+            return list(store.store)
+        if isinstance(getattr(store, "index_to_docstore_id", None), dict):
+            return list(store.index_to_docstore_id.values())
+        if hasattr(store, "_collection") and hasattr(store, "get"):
+            return store.get(include=[])["ids"]
+        raise ValueError(f"{type(store).__name__} cannot list its IDs, pass the IDs of the documents to compact.")
+
+    def _reserve_new_chunks(self, documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Chunks not added by this wrapper yet, without repeats, with their IDs now reserved"""
+        new_documents: Dict[str, Document] = {}
+        for document in documents:
+            chunk_id = _chunk_id(document)
+            if chunk_id not in self._known_ids and chunk_id not in new_documents:
+                new_documents[chunk_id] = document
+        self._known_ids.update(new_documents)
+        return list(new_documents.values()), list(new_documents)
+
+    def _ids_in_store(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        if self._supports_get_by_ids:
+            try:
+                return {document.id for document in self.vector_store.get_by_ids(ids)}
+            except NotImplementedError:
+                self._supports_get_by_ids = False
+        # Only the chunks added by this wrapper and those in the manifest are known then
+        return self._manifest_ids.intersection(ids)
+
+    def _add_batch(self, documents: List[Document]):
+        ids = [_chunk_id(document) for document in documents]
+        try:
+            self.vector_store.add_documents(documents, ids=ids)
+        except Exception:
+            self._known_ids.difference_update(ids)
+            raise
+        self._append_manifest(ids)
+
+    def _read_manifest(self) -> Set[str]:
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return set()
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _append_manifest(self, ids: List[str]):
+        # Chunks added again to a store that lost them are already listed
+        ids = [chunk_id for chunk_id in ids if chunk_id not in self._manifest_ids]
+        self._manifest_ids.update(ids)
+        if self.manifest_path and ids:
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id in ids))
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        # The queue belongs to the event loop of the research, a new loop gets a new queue and worker
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not asyncio.get_running_loop():
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.create_task(self._add_batches(self._queue))
+        return self._queue
+
+    async def _add_batches(self, queue: asyncio.Queue):
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                # Put by flush once the queue is drained
+                queue.task_done()
+                return
+            ids = [_chunk_id(document) for document in batch]
+            try:
+                # Stores without native async support run add_documents in an executor
+                await self.vector_store.aadd_documents(batch, ids=ids)
+                self._append_manifest(ids)
+            except Exception as e:
+                self._known_ids.difference_update(ids)
+                self._errors.append(e)
+            finally:
+                queue.task_done()
+
     def _create_langchain_documents(self, data: List[Dict[str, str]]) -> List[Document]:
         """Convert GPT Researcher Document to Langchain Document"""
         return [Document(page_content=item["raw_content"], metadata={"source": item["url"]}) for item in data]
 
-    def _split_documents(self, documents: List[Document], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
+    def _split_documents(self, documents: List[Document], chunk_size: int = 250, chunk_overlap: int = 50) -> List[Document]:
         """
-        Split documents into smaller chunks
+        Split documents into chunks of at most chunk_size tokens
         """
-        text_splitter = RecursiveCharacterTextSplitter(
+        text_splitter = SentenceTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
         )
@@ -39,5 +237,29 @@ class VectorStoreWrapper:
 
     async def asimilarity_search(self, query, k, filter):
         """Return query by vector store"""
+        # Documents still queued are loaded first so they can be found
+        await self.flush()
         results = await self.vector_store.asimilarity_search(query=query, k=k, filter=filter)
         return results
+
+    async def asimilarity_search_batch(self, queries: List[str], k: int, filter=None) -> List[List[Document]]:
+        """
+        Return the documents of each query by vector store, the same as asimilarity_search for each query
+        The queries are embedded concurrently with embed_query when the store exposes its embeddings and
+        searches by vector, so no search waits for another query's embedding
+        """
+        await self.flush()
+        embeddings = getattr(self.vector_store, "embeddings", None)
+        searches_by_vector = type(self.vector_store).similarity_search_by_vector is not VectorStore.similarity_search_by_vector
+        if not queries or embeddings is None or not searches_by_vector:
+            return await asyncio.gather(
+                *[self.vector_store.asimilarity_search(query=query, k=k, filter=filter) for query in queries]
+            )
+
+        query_vectors = await embed_queries(embeddings, list(queries))
+        return await asyncio.gather(
+            *[
+                self.vector_store.asimilarity_search_by_vector(query_vector, k=k, filter=filter)
+                for query_vector in query_vectors
+            ]
+        )
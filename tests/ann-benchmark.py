@@ -0,0 +1,68 @@
+"""
+Recall and latency of the IVF index used for local documents against exact search, on generated
+clustered embeddings of 10k to 1M chunks.
+
+    python tests/ann-benchmark.py [--sizes 10000,100000,1000000] [--dim 256] [--probes 1,4,8,16,32]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gpt_researcher.context.ann import IVFIndex
+from gpt_researcher.context.ranking import normalize, top_k_by_score
+
+
+def generate_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around random topics, like the chunks of a corpus of documents"""
+    topics = normalize(rng.standard_normal((max(1, int(4 * np.sqrt(n))), dim), dtype=np.float32))
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        end = min(n, start + 100000)
+        assigned = topics[rng.integers(0, len(topics), end - start)]
+        noise = rng.standard_normal((end - start, dim), dtype=np.float32) / np.sqrt(dim)
+        vectors[start:end] = normalize(assigned + noise)
+    return vectors
+
+
+def benchmark(n: int, dim: int, probes, queries: int, k: int):
+    rng = np.random.default_rng(0)
+    vectors = generate_vectors(n, dim, rng)
+    noise = rng.standard_normal((queries, dim), dtype=np.float32) / np.sqrt(dim)
+    query_vectors = normalize(vectors[rng.integers(0, n, queries)] + 0.5 * noise)
+
+    start = time.perf_counter()
+    exact = [set(top_k_by_score(vectors @ q, k)[0].tolist()) for q in query_vectors]
+    exact_ms = (time.perf_counter() - start) / queries * 1000
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    index.train(vectors)
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+    print(f"\n{n} chunks x {dim} dims: {len(index.centroids)} lists built in {build_s:.1f}s, exact search {exact_ms:.2f} ms/query")
+
+    for n_probe in probes:
+        start = time.perf_counter()
+        found = [index.search(vectors, q, k, n_probe=n_probe)[0] for q in query_vectors]
+        ann_ms = (time.perf_counter() - start) / queries * 1000
+        recall = np.mean([len(exact[i] & set(rows.tolist())) / k for i, rows in enumerate(found)])
+        print(f"  n_probe={n_probe:<4} recall@{k} {recall:.3f}  {ann_ms:.2f} ms/query  ({exact_ms / ann_ms:.1f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--probes", default="1,4,8,16,32")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    probes = [int(p) for p in args.probes.split(",")]
+    for n in (int(size) for size in args.sizes.split(",")):
+        benchmark(n, args.dim, probes, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
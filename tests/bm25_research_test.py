@@ -0,0 +1,102 @@
+"""
+With RETRIEVAL_MODE=bm25 a research makes no embedding calls: sub-queries are deduplicated and the
+information gain of adaptive research is measured on term vectors, and chunks are ranked by BM25.
+"""
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from gpt_researcher.actions.query_processing import SubQueryDeduplicator, deduplicate_sub_queries
+from gpt_researcher.agent import GPTResearcher
+
+QUERY = "What are the health benefits of green tea?"
+SUB_QUERIES = [
+    "health benefits of green tea",
+    "benefits of green tea for health",
+    "green tea caffeine content",
+    "green tea antioxidants catechins",
+]
+PAGES = [
+    {
+        "url": "https://example.com/green-tea",
+        "title": "Green tea",
+        "raw_content": (
+            "Green tea is rich in antioxidants called catechins. "
+            "The health benefits of green tea include better brain function and fat loss. "
+            "A cup of green tea contains about 30 milligrams of caffeine. "
+        ) * 20,
+    },
+    {
+        "url": "https://example.com/tea-history",
+        "title": "History of tea",
+        "raw_content": "Tea was first brewed in China thousands of years ago and spread along trade routes. " * 20,
+    },
+]
+
+
+class RaisingEmbeddings(Embeddings):
+    # Errors of some embedding calls are caught and logged, so the calls are counted as well
+    calls = 0
+
+    def embed_documents(self, texts):
+        RaisingEmbeddings.calls += 1
+        raise AssertionError("bm25 mode embedded documents")
+
+    def embed_query(self, text):
+        RaisingEmbeddings.calls += 1
+        raise AssertionError("bm25 mode embedded a query")
+
+
+class RaisingMemory:
+    def get_embeddings(self):
+        return RaisingEmbeddings()
+
+
+def research(monkeypatch, adaptive_research: bool):
+    monkeypatch.setenv("RETRIEVAL_MODE", "bm25")
+    monkeypatch.setenv("EMBEDDING", "local_hashing:64")
+    researcher = GPTResearcher(QUERY, verbose=False)
+    researcher.cfg.adaptive_research = adaptive_research
+    researcher.memory = RaisingMemory()
+    RaisingEmbeddings.calls = 0
+
+    async def plan_research(query, speculative_scrape=False):
+        return list(SUB_QUERIES)
+
+    conductor = researcher.research_conductor
+    monkeypatch.setattr(conductor, "plan_research", plan_research)
+    context = asyncio.run(conductor._get_context_by_web_search(QUERY, PAGES))
+    assert RaisingEmbeddings.calls == 0
+    return context
+
+
+def test_bm25_research_makes_no_embedding_calls(monkeypatch):
+    context = research(monkeypatch, adaptive_research=False)
+    assert any("catechins" in sub_context for sub_context in context)
+
+
+def test_bm25_adaptive_research_makes_no_embedding_calls(monkeypatch):
+    context = research(monkeypatch, adaptive_research=True)
+    assert any("catechins" in sub_context for sub_context in context)
+
+
+def test_lexical_sub_query_deduplication():
+    deduplicated = asyncio.run(
+        deduplicate_sub_queries(SUB_QUERIES + [QUERY], RaisingEmbeddings(), 0.9, keep=[QUERY], lexical=True)
+    )
+    assert deduplicated == [
+        "health benefits of green tea",
+        "green tea caffeine content",
+        "green tea antioxidants catechins",
+        QUERY,
+    ]
+
+    async def streamed():
+        deduplicator = SubQueryDeduplicator(RaisingEmbeddings(), 0.9, keep=[QUERY], lexical=True)
+        return [sub_query for sub_query in SUB_QUERIES if not await deduplicator.is_duplicate(sub_query)]
+
+    assert asyncio.run(streamed()) == [
+        "health benefits of green tea",
+        "green tea caffeine content",
+        "green tea antioxidants catechins",
+    ]
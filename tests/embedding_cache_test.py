@@ -0,0 +1,51 @@
+"""
+Several processes share one embedding cache: every cached text must always come back with its own
+vector, while the processes append to the same namespace and evict and compact it.
+"""
+import hashlib
+import multiprocessing
+
+import numpy as np
+
+from gpt_researcher.memory.embedding_cache import EmbeddingCacheStore, text_hash
+
+NAMESPACE = "test:model"
+DIM = 16
+
+
+def vector_of(text: str) -> np.ndarray:
+    digest = np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)[:DIM]
+    return (digest.astype(np.float32) / 255).astype(np.float16).astype(np.float32)
+
+
+def write_and_read(path: str, worker: int, batches: int = 30, batch_size: int = 8) -> int:
+    """Puts batches of texts and reads back everything written so far, returns the wrong vectors read"""
+    # Small enough for the processes to evict and compact the namespace many times
+    store = EmbeddingCacheStore(path, max_bytes=DIM * 2 * 120)
+    written = []
+    wrong = 0
+    for batch in range(batches):
+        texts = [f"worker {worker} batch {batch} text {i}" for i in range(batch_size)]
+        store.put(NAMESPACE, [text_hash(text) for text in texts], np.stack([vector_of(text) for text in texts]))
+        written.extend(texts)
+        cached = store.get(NAMESPACE, [text_hash(text) for text in written])
+        wrong += sum(
+            not np.array_equal(cached[text_hash(text)], vector_of(text)) for text in written if text_hash(text) in cached
+        )
+    return wrong
+
+
+def test_processes_share_the_cache(tmp_path):
+    path = str(tmp_path / "embedding-cache")
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        wrong = pool.starmap(write_and_read, [(path, worker) for worker in range(4)])
+    assert wrong == [0, 0, 0, 0]
+
+    store = EmbeddingCacheStore(path, max_bytes=DIM * 2 * 120)
+    texts = [f"worker {worker} batch {batch} text {i}" for worker in range(4) for batch in range(30) for i in range(8)]
+    cached = store.get(NAMESPACE, [text_hash(text) for text in texts])
+    assert cached
+    for text in texts:
+        if text_hash(text) in cached:
+            assert np.array_equal(cached[text_hash(text)], vector_of(text))
+    assert store.bytes_used <= store.max_bytes
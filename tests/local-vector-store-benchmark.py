@@ -0,0 +1,97 @@
+"""
+Ingest, open and search times of LocalVectorStore on generated clustered embeddings, and the recall
+of its IVF-indexed segments against exact search. Opening the store and the first search run in a
+new process, as in a new worker.
+
+    python tests/local-vector-store-benchmark.py [--sizes 100000,1000000] [--dim 256] [--path /tmp/lvs-benchmark]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from gpt_researcher.context.ranking import normalize
+from gpt_researcher.vector_store import LocalVectorStore
+
+OPEN_AND_SEARCH = """
+import time
+start = time.perf_counter()
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from gpt_researcher.vector_store import LocalVectorStore
+imported = time.perf_counter()
+store = LocalVectorStore({path!r}, DeterministicFakeEmbedding(size={dim}))
+opened = time.perf_counter()
+store.similarity_search_by_vector(np.ones({dim}, dtype=np.float32).tolist(), k=10)
+searched = time.perf_counter()
+print(f"{{(opened - imported) * 1000:.1f}} {{(searched - opened) * 1000:.1f}}")
+"""
+
+
+def benchmark(n: int, dim: int, path: str, batch_size: int = 10000):
+    shutil.rmtree(path, ignore_errors=True)
+    rng = np.random.default_rng(0)
+    topics = normalize(rng.standard_normal((max(1, int(4 * np.sqrt(n))), dim), dtype=np.float32))
+    store = LocalVectorStore(path, DeterministicFakeEmbedding(size=dim))
+
+    start = time.perf_counter()
+    for batch_start in range(0, n, batch_size):
+        size = min(batch_size, n - batch_start)
+        noise = rng.standard_normal((size, dim), dtype=np.float32) / np.sqrt(dim)
+        vectors = normalize(topics[rng.integers(0, len(topics), size)] + noise)
+        store.add_embeddings(
+            ((f"chunk {batch_start + i}", vector) for i, vector in enumerate(vectors)),
+            metadatas=[{"source": f"page {(batch_start + i) // 20}"} for i in range(len(vectors))],
+        )
+    store.merge()
+    store.close()
+    ingest_s = time.perf_counter() - start
+    segments = len(os.listdir(os.path.join(path, "segments")))
+    print(f"\n{n} chunks x {dim} dims: ingested and merged in {ingest_s:.1f}s ({n / ingest_s:.0f} chunks/s), {segments} files")
+
+    code = OPEN_AND_SEARCH.format(path=path, dim=dim)
+    open_ms, first_search_ms = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+    print(f"  new process: open {open_ms} ms, first search {first_search_ms} ms")
+
+    store = LocalVectorStore(path, DeterministicFakeEmbedding(size=dim))
+    noise = rng.standard_normal((20, dim), dtype=np.float32) / np.sqrt(dim)
+    queries = normalize(topics[rng.integers(0, len(topics), 20)] + 0.5 * noise)
+    for n_probe in (10 ** 9, 8, 32):
+        store.n_probe = n_probe
+        start = time.perf_counter()
+        found = [{d.id for d in store.similarity_search_by_vector(query.tolist(), k=10)} for query in queries]
+        search_ms = (time.perf_counter() - start) / len(queries) * 1000
+        if n_probe == 10 ** 9:
+            exact = found
+            print(f"  exact search {search_ms:.1f} ms/query")
+        else:
+            recall = np.mean([len(a & b) / 10 for a, b in zip(exact, found)])
+            print(f"  search n_probe={n_probe} {search_ms:.1f} ms/query, recall@10 {recall:.3f}")
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        store.similarity_search_by_vector(query.tolist(), k=10, filter={"source": {"$in": [f"page {i}", f"page {i + 1}"]}})
+    print(f"  search filtered to 2 pages {(time.perf_counter() - start) / len(queries) * 1000:.1f} ms/query")
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--path", default="/tmp/lvs-benchmark")
+    args = parser.parse_args()
+
+    for n in (int(size) for size in args.sizes.split(",")):
+        benchmark(n, args.dim, args.path)
+    shutil.rmtree(args.path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
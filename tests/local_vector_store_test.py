@@ -0,0 +1,84 @@
+"""
+Searches running while segments are merged must keep finding every document: a merge removes the
+files of the old segments as soon as it commits, while searches may still be reading them, in the
+same store or in another one opened on the same folder, like another process would.
+"""
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from gpt_researcher.vector_store.local_vector_store import LocalVectorStore
+
+DIM = 16
+SEGMENT_ROWS = 20
+
+
+class NoEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        raise AssertionError("vectors are given")
+
+    def embed_query(self, text):
+        raise AssertionError("vectors are given")
+
+
+def add_segment(store: LocalVectorStore, vectors: np.ndarray, first: int) -> None:
+    ids = [str(first + i) for i in range(len(vectors))]
+    store.add_embeddings(zip(ids, vectors.tolist()), [{"parity": (first + i) % 2} for i in range(len(vectors))], ids=ids)
+
+
+def test_searches_during_merges(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((40 * SEGMENT_ROWS, DIM)).astype(np.float32)
+    # Merged segments of 2 segments or more get an IVF index
+    store = LocalVectorStore(
+        str(tmp_path / "store"),
+        NoEmbeddings(),
+        max_segments=1000,
+        merge_in_background=False,
+        ann_min_rows=2 * SEGMENT_ROWS,
+        n_probe=1000,
+    )
+    add_segment(store, vectors[:SEGMENT_ROWS], 0)
+    reader = LocalVectorStore(str(tmp_path / "store"), NoEmbeddings(), n_probe=1000)
+
+    added = SEGMENT_ROWS
+    added_lock = threading.Lock()
+    done = threading.Event()
+    errors = []
+    wrong = []
+
+    def search(searched: LocalVectorStore):
+        searcher_rng = np.random.default_rng(threading.get_ident() % 2**32)
+        while not done.is_set():
+            with added_lock:
+                i = int(searcher_rng.integers(added))
+            try:
+                # Filtered searches score the rows of the filter instead of the IVF candidates
+                parity_filter = {"parity": i % 2} if searcher_rng.random() < 0.5 else None
+                found = searched.similarity_search_by_vector(vectors[i].tolist(), k=1, filter=parity_filter)
+            except Exception as e:
+                errors.append(e)
+                return
+            if [document.id for document in found] != [str(i)]:
+                wrong.append((i, found))
+
+    searchers = [threading.Thread(target=search, args=(searched,)) for searched in (store, reader) * 2]
+    for searcher in searchers:
+        searcher.start()
+    try:
+        for start in range(SEGMENT_ROWS, len(vectors), SEGMENT_ROWS):
+            add_segment(store, vectors[start:start + SEGMENT_ROWS], start)
+            with added_lock:
+                added = start + SEGMENT_ROWS
+            if start % (3 * SEGMENT_ROWS) == 0:
+                store.merge()
+    finally:
+        done.set()
+        for searcher in searchers:
+            searcher.join()
+        store.close()
+        reader.close()
+
+    assert not errors
+    assert not wrong